@@ -1,26 +1,21 @@
 from django.apps import AppConfig
-from django.db.models.signals import post_migrate
+from django.db.models.signals import m2m_changed, post_migrate, post_save, pre_delete, post_delete
 
-from collab.util import db_table_exists, db_table_column_exists
-from spaces_wiki.signals import create_notice_types
+from spaces_wiki.signals import create_notice_types, create_root, article_saved, \
+    article_changed, urlpath_saved, urlpath_changed, wikiarticle_saved, wikiarticle_changed, \
+    object_permission_changed, memberships_changed, wiki_deleting
 
 class SpacesWikiConfig(AppConfig):
     name = 'spaces_wiki'
 
     def ready(self):
-        # django-wiki needs a root page.
-        # create_root emulates get_or_create, so this should only create 
-        # a new root file if none exists yet.
+        # no database access here, this runs on every process start.
+        # django-wiki's root page is created after migrations instead.
         from wiki.models import URLPath
 
-        if db_table_exists('django_site'):
-            # the following condition was needed for a wiki migration of wiki 0.3.1
-            if db_table_column_exists('wiki_urlpath', 'moved_to_id'):
-                URLPath.create_root()
-
         # activate activity streams for WikiArticle
         from actstream import registry
-        from .models import WikiArticle
+        from .models import SpacesWiki, WikiArticle
         registry.register(WikiArticle)
 
         # register a custom notification
@@ -38,4 +33,30 @@ class SpacesWikiConfig(AppConfig):
             _('An article has been modified.')
         )
         """
-        post_migrate.connect(create_notice_types, sender=self)
\ No newline at end of file
+        post_migrate.connect(create_notice_types, sender=self)
+        post_migrate.connect(create_root, sender=self)
+
+        # keep cached per-space data (table of contents, path and search
+        # index etc.) in sync
+        from wiki.models import Article
+        post_save.connect(article_saved, sender=Article)
+        pre_delete.connect(article_changed, sender=Article)
+        post_save.connect(urlpath_saved, sender=URLPath)
+        post_delete.connect(urlpath_changed, sender=URLPath)
+        post_save.connect(wikiarticle_saved, sender=WikiArticle)
+        post_delete.connect(wikiarticle_changed, sender=WikiArticle)
+        # remove articles of deleted spaces, see spaces_wiki.trash
+        pre_delete.connect(wiki_deleting, sender=SpacesWiki)
+
+        # keep cached space permissions in sync, see spaces_wiki.permissions
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import Group
+        from guardian.models import GroupObjectPermission, UserObjectPermission
+        for model in (UserObjectPermission, GroupObjectPermission):
+            post_save.connect(object_permission_changed, sender=model)
+            post_delete.connect(object_permission_changed, sender=model)
+        User = get_user_model()
+        for through in (User.groups.through, User.user_permissions.through,
+                        Group.permissions.through):
+            m2m_changed.connect(memberships_changed, sender=through)
+        post_delete.connect(memberships_changed, sender=Group)
@@ -0,0 +1,134 @@
+import time
+from django.core.cache import cache
+from wiki.conf import settings
+from wiki.models import URLPath
+
+from .queries import space_children
+
+TREE_VERSION_KEY = 'spaces_wiki:tree_version:%s'
+TOC_KEY = 'spaces_wiki:toc:%s:%s'
+CHILDREN_KEY = 'spaces_wiki:children:%s:%s:%s:%s:%s'
+
+
+def get_version(key):
+    """
+        Returns the current version token stored at key.
+    """
+    version = cache.get(key)
+    if version is None:
+        # start from a timestamp instead of 1, so that an evicted version
+        # key can't resurrect stale entries of an older version.
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+def bump_version(key):
+    """
+        Changes the version token stored at key.
+    """
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+def get_tree_version(space_id):
+    """
+        Returns the current version token of a space's article tree.
+        Every cache entry derived from the tree includes this token in its
+        key, so bumping it invalidates all of them at once.
+    """
+    return get_version(TREE_VERSION_KEY % space_id)
+
+def bump_tree_version(space_id):
+    """
+        Invalidates everything cached for the given space's article tree.
+    """
+    bump_version(TREE_VERSION_KEY % space_id)
+
+
+def build_toc(space_id):
+    """
+        Builds the table of contents of a space as a nested list of dicts
+        with the keys 'path', 'title' and 'children'. Deleted articles and
+        everything below them are left out.
+        Costs one query regardless of the number of articles.
+    """
+    rows = URLPath.objects.filter(
+        article__wikiarticle__space_id=space_id
+    ).order_by('tree_id', 'lft').values_list(
+        'id',
+        'parent_id',
+        'slug',
+        'article__wikiarticle__title',
+        'article__wikiarticle__deleted',
+    )
+    nodes = {}
+    hidden = set()
+    toc = []
+    for pk, parent_id, slug, title, deleted in rows:
+        # deleted articles hide their whole subtree
+        if deleted or parent_id in hidden:
+            hidden.add(pk)
+            continue
+        parent = nodes.get(parent_id)
+        node = {
+            # parents are not part of the space if they are the wiki root
+            'path': '%s%s/' % (parent['path'] if parent else '', slug),
+            'title': title,
+            'children': [],
+        }
+        nodes[pk] = node
+        if parent:
+            parent['children'].append(node)
+        else:
+            toc.append(node)
+    return toc
+
+def get_toc(space_id):
+    """
+        Returns the table of contents of a space from the cache, building
+        and storing it first if neccessary.
+    """
+    key = TOC_KEY % (space_id, get_tree_version(space_id))
+    toc = cache.get(key)
+    if toc is None:
+        toc = build_toc(space_id)
+        cache.set(key, toc, settings.CACHE_TIMEOUT)
+    return toc
+
+
+def get_permission_group(user, space_id):
+    """
+        Returns a token for the set of articles user may read in a space.
+        It changes with the versions of the cached space permissions (see
+        spaces_wiki.permissions), so memberships and roles changes take
+        effect right away.
+    """
+    from .permissions import get_permissions_version
+    if user.has_perm('wiki.moderate'):
+        group = 'moderator'
+    elif user.is_anonymous:
+        group = 'anonymous'
+    else:
+        # reading rights also depend on ownership and group membership
+        group = 'user-%s' % user.pk
+    return '%s-%s' % (group, get_permissions_version(space_id))
+
+def get_children(urlpath, space_id, user, max_num=None):
+    """
+        Returns the children of urlpath visible to user, as returned by
+        queries.space_children, memoized per article, space and permission
+        group until the space's tree changes.
+    """
+    key = CHILDREN_KEY % (
+        space_id,
+        get_tree_version(space_id),
+        urlpath.pk,
+        get_permission_group(user, space_id),
+        max_num,
+    )
+    children = cache.get(key)
+    if children is None:
+        children = space_children(urlpath, space_id, user, max_num)
+        cache.set(key, children, settings.CACHE_TIMEOUT)
+    return children
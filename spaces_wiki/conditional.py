@@ -0,0 +1,92 @@
+"""
+    Conditional GET support for article pages.
+
+    The ETag of a page combines the article's current revision, the
+    version of its space's tree (see spaces_wiki.cache), the versions of
+    the space's permissions (see spaces_wiki.permissions), the user and
+    the language, so a revalidation request is answered with a 304 after a
+    single query, before the article is resolved and before any template,
+    children or table of contents is rendered. Last-Modified only reflects
+    the article itself; clients sending both headers are validated by the
+    ETag alone.
+"""
+from django.utils.translation import get_language
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from wiki.models import Article
+
+from .cache import get_permission_group, get_tree_version
+from .models import ArticlePath
+from .permissions import get_space_permissions
+
+# request attribute memoizing the article state
+REQUEST_ATTR = '_spaces_wiki_conditional'
+
+
+def get_article_state(request, path=None, article_id=None, **kwargs):
+    """
+        Returns the article requested by path or article_id, with its
+        current revision but without content, or None if it isn't a
+        readable article of the current space.
+        The wiki root is shared by all spaces and never cached.
+    """
+    if not hasattr(request, REQUEST_ATTR):
+        if not get_space_permissions(request.user, request.SPACE).access:
+            # the view's access check has to run
+            setattr(request, REQUEST_ATTR, None)
+            return None
+        articles = Article.objects.select_related(
+            'current_revision'
+        ).defer('current_revision__content')
+        if article_id is not None:
+            articles = articles.filter(
+                pk=article_id,
+                wikiarticle__wiki__space=request.SPACE
+            )
+        elif path:
+            articles = articles.filter(
+                articlepath__space=request.SPACE,
+                articlepath__path=ArticlePath.normalize(path)
+            )
+        else:
+            articles = articles.none()
+        article = articles.first()
+        if article is not None and (article.current_revision is None or
+                                    not article.can_read(request.user)):
+            # let the view deal with it
+            article = None
+        setattr(request, REQUEST_ATTR, article)
+    return getattr(request, REQUEST_ATTR)
+
+def article_etag(request, *args, **kwargs):
+    article = get_article_state(request, **kwargs)
+    if article is None:
+        return None
+    return '%s-%s-%s-%s-%s' % (
+        article.current_revision_id,
+        get_tree_version(request.SPACE.pk),
+        # includes the versions of the space's permissions
+        get_permission_group(request.user, request.SPACE.pk),
+        request.user.pk,
+        get_language(),
+    )
+
+def article_last_modified(request, *args, **kwargs):
+    article = get_article_state(request, **kwargs)
+    if article is None:
+        return None
+    return article.current_revision.modified
+
+def article_condition(func):
+    """
+        View decorator answering conditional GETs of article pages with
+        304 if the ETag still matches. Has to be applied outside of wiki's
+        get_article decorator. Pages are marked private and have to be
+        revalidated on every use, as they depend on the user.
+    """
+    return cache_control(private=True, no_cache=True)(
+        condition(
+            etag_func=article_etag,
+            last_modified_func=article_last_modified
+        )(func)
+    )
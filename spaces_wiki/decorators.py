@@ -1,28 +1,56 @@
+from functools import wraps
 from django.core.exceptions import PermissionDenied
-from django.shortcuts import get_object_or_404
-from wiki.models.urlpath import URLPath
-from collab.util import is_owner_or_admin
+from .permissions import get_space_permissions
+from .resolver import resolve_article
 
 
+def _resolve_from_view_args(request, args, kwargs):
+    """
+    Returns the ResolvedArticle of the decorated view, reusing the article
+    and urlpath wiki's get_article decorator already passed along.
+    """
+    article = args[0] if args else None
+    urlpath = kwargs.get('urlpath')
+    if article is None and urlpath is None:
+        return resolve_article(request, path=kwargs.get('path'))
+    return resolve_article(request, article=article, urlpath=urlpath)
+
+def space_access_required(func):
+    """
+    view decorator raising 403 if user may not access the current space.
+    Replaces collab's permission_required_or_403('access_space') with a
+    check against the cached permissions of the user.
+    """
+    @wraps(func)
+    def _decorator(request, *args, **kwargs):
+        if get_space_permissions(request.user, request.SPACE).access:
+            return func(request, *args, **kwargs)
+        raise PermissionDenied
+    return _decorator
+
+def space_admin_required(func):
+    """
+    view decorator raising 403 if user is neither a space administrator
+    nor a manager. Replaces collab's space_admin_required with a check
+    against the cached permissions of the user.
+    """
+    @wraps(func)
+    def _decorator(request, *args, **kwargs):
+        if request.user.is_authenticated and \
+                get_space_permissions(request.user, request.SPACE).admin:
+            return func(request, *args, **kwargs)
+        raise PermissionDenied
+    return _decorator
+
 def article_owner_or_admin_required(func):
     """
     method decorator raising 403 if user is neither the owner of the file
     nor a space administrator or manager.
     """
     def _decorator(self, *args, **kwargs):
-        if 'path' in kwargs.keys():
-            slug = kwargs['path']
-            slug = slug[:-1] if slug[-1] == '/' else slug
-        else:
-            slug = None
-        obj = get_object_or_404(URLPath, slug=slug)
         if self.user and self.user.is_authenticated:
-            is_allowed = is_owner_or_admin(
-                self.user,
-                obj.article.owner,
-                self.SPACE
-            )
-            if is_allowed:
+            resolved = _resolve_from_view_args(self, args, kwargs)
+            if resolved.is_owner_or_admin(self.user, self.SPACE):
                 return func(self, *args, **kwargs)
         raise PermissionDenied
     return _decorator
@@ -34,20 +62,12 @@ def article_owner_or_admin_required_for_restore(func):
       preventing undeleting articles the user hasn't authored.
     """
     def _decorator(self, *args, **kwargs):
-        if 'path' in kwargs.keys():
-            slug = kwargs['path']
-            slug = slug[:-1] if slug[-1] == '/' else slug
-        else:
-            slug = None
-        obj = get_object_or_404(URLPath, slug=slug)
         if self.user and self.user.is_authenticated:
-            is_allowed = is_owner_or_admin(
-                self.user,
-                obj.article.owner,
-                self.SPACE
-            )
             no_restore = 'restore' not in self.GET
-            if is_allowed or no_restore:
+            if no_restore:
+                return func(self, *args, **kwargs)
+            resolved = _resolve_from_view_args(self, args, kwargs)
+            if resolved.is_owner_or_admin(self.user, self.SPACE):
                 return func(self, *args, **kwargs)
         raise PermissionDenied
     return _decorator
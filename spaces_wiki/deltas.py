@@ -0,0 +1,162 @@
+"""
+    Delta storage for old revisions.
+
+    With SPACES_WIKI_DELTA_REVISIONS enabled, a revision that is no longer
+    current has its content replaced by a RevisionDelta to the nearest
+    older revision that still holds its full content (a snapshot). At most
+    SPACES_WIKI_SNAPSHOT_INTERVAL - 1 deltas refer to the same snapshot,
+    after that the next revision is kept in full and becomes the new
+    snapshot. Every delta is relative to a snapshot, so restoring a
+    revision costs a single delta application.
+
+    Current revisions always hold their full content, so everything that
+    only reads article.current_revision is unaffected.
+"""
+import difflib
+import json
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from wiki.models import ArticleRevision
+
+from .models import RevisionDelta
+
+DELTA_REVISIONS = getattr(settings, 'SPACES_WIKI_DELTA_REVISIONS', False)
+SNAPSHOT_INTERVAL = getattr(settings, 'SPACES_WIKI_SNAPSHOT_INTERVAL', 20)
+
+
+def make_delta(base, content):
+    """
+        Returns the delta turning the text base into content, as JSON list
+        of [start, end] line ranges copied from base and inserted strings.
+    """
+    base_lines = base.splitlines(True)
+    lines = content.splitlines(True)
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    ops = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j1 < j2:
+            ops.append(''.join(lines[j1:j2]))
+    return json.dumps(ops, separators=(',', ':'))
+
+def apply_delta(base, delta):
+    """
+        Restores the text a delta was made from.
+    """
+    base_lines = base.splitlines(True)
+    parts = []
+    for op in json.loads(delta):
+        if isinstance(op, list):
+            parts.extend(base_lines[op[0]:op[1]])
+        else:
+            parts.append(op)
+    return ''.join(parts)
+
+
+def get_snapshot_ids(article_id):
+    """
+        Returns the ids of the article's revisions that deltas refer to.
+        These must neither be deleted nor delta-encoded.
+    """
+    return set(RevisionDelta.objects.filter(
+        base__article_id=article_id
+    ).values_list('base_id', flat=True))
+
+def encode_revision(revision, base):
+    """
+        Replaces the content of revision by a delta to base, unless the
+        delta wouldn't be smaller. Returns True if the delta was stored.
+    """
+    delta = make_delta(base.content, revision.content)
+    if len(delta) >= len(revision.content):
+        return False
+    RevisionDelta.objects.create(revision=revision, base=base, delta=delta)
+    ArticleRevision.objects.filter(pk=revision.pk).update(content='')
+    revision.content = ''
+    return True
+
+@transaction.atomic
+def store_delta(revision):
+    """
+        Delta-encodes revision, which must not be the current revision of
+        its article, against the nearest older snapshot.
+        Returns True if the delta was stored.
+    """
+    if RevisionDelta.objects.filter(Q(revision=revision) | Q(base=revision)).exists():
+        return False
+    base = ArticleRevision.objects.filter(
+        article_id=revision.article_id,
+        revision_number__lt=revision.revision_number,
+        delta__isnull=True
+    ).order_by('-revision_number').first()
+    if base is None:
+        return False
+    if RevisionDelta.objects.filter(base=base).count() >= SNAPSHOT_INTERVAL - 1:
+        # keep this one in full, it becomes the next snapshot
+        return False
+    return encode_revision(revision, base)
+
+def load_content(revisions):
+    """
+        Restores the content of delta-encoded revisions in place, without
+        saving them. Costs one query for any number of revisions, none if
+        all of them hold their full content.
+    """
+    encoded = {
+        revision.pk: revision
+        for revision in revisions
+        if revision is not None and not revision.content
+    }
+    if not encoded:
+        return
+    deltas = RevisionDelta.objects.filter(
+        revision__in=list(encoded)
+    ).select_related('base')
+    for delta in deltas:
+        encoded[delta.revision_id].content = apply_delta(
+            delta.base.content,
+            delta.delta
+        )
+
+@transaction.atomic
+def expand_revision(revision):
+    """
+        Stores the full content of a delta-encoded revision again, e.g.
+        before it becomes the current revision.
+    """
+    load_content([revision])
+    deleted, _ = RevisionDelta.objects.filter(revision=revision).delete()
+    if deleted:
+        ArticleRevision.objects.filter(pk=revision.pk).update(
+            content=revision.content)
+
+@transaction.atomic
+def compress_article(article, snapshot_interval=SNAPSHOT_INTERVAL):
+    """
+        Delta-encodes all old revisions of article that still hold their
+        full content. Returns the number of revisions encoded.
+    """
+    encoded_ids = set(RevisionDelta.objects.filter(
+        revision__article=article
+    ).values_list('revision_id', flat=True))
+    counts = dict(RevisionDelta.objects.filter(
+        base__article=article
+    ).values('base').annotate(count=Count('pk')).values_list('base', 'count'))
+    revisions = article.articlerevision_set.exclude(
+        pk__in=encoded_ids
+    ).exclude(
+        pk=article.current_revision_id
+    ).order_by('revision_number')
+    base = None
+    encoded = 0
+    for revision in revisions.iterator():
+        if base is not None and revision.pk not in counts and \
+            counts.get(base.pk, 0) < snapshot_interval - 1 and \
+            encode_revision(revision, base):
+            counts[base.pk] = counts.get(base.pk, 0) + 1
+            encoded += 1
+        else:
+            base = revision
+    return encoded
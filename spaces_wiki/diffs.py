@@ -0,0 +1,96 @@
+"""
+    Server-side revision diffs.
+
+    A diff is a list of hunks, each a dict with the line ranges it covers
+    ('old_start', 'old_lines', 'new_start', 'new_lines', 1-based like in
+    unified diffs) and its 'lines'. A line is a list [tag, text], with tag
+    ' ' for context, '-' for removed and '+' for added lines. Lines of a
+    replaced block get a third item marking the changed words: a list of
+    [changed, text] segments.
+"""
+import difflib
+import re
+from django.core.cache import cache
+from wiki.conf import settings
+
+from .deltas import load_content
+
+DIFF_KEY = 'spaces_wiki:diff:%s:%s'
+CONTEXT_LINES = 3
+# word level changes are only marked in replaced blocks up to this size
+MAX_WORD_DIFF_LINES = 50
+
+WORD_RE = re.compile(r'\w+|\s+|[^\w\s]')
+
+
+def diff_words(old, new):
+    """
+        Returns the segments of the lines old and new, marking the words
+        that differ.
+    """
+    a = WORD_RE.findall(old)
+    b = WORD_RE.findall(new)
+    old_parts = []
+    new_parts = []
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        changed = tag != 'equal'
+        if i1 < i2:
+            old_parts.append([changed, ''.join(a[i1:i2])])
+        if j1 < j2:
+            new_parts.append([changed, ''.join(b[j1:j2])])
+    return old_parts, new_parts
+
+def diff_hunks(old, new, context=CONTEXT_LINES):
+    """
+        Returns the hunks turning the text old into new, with context
+        lines of unchanged text around every change.
+    """
+    a = old.splitlines()
+    b = new.splitlines()
+    matcher = difflib.SequenceMatcher(None, a, b)
+    hunks = []
+    for group in matcher.get_grouped_opcodes(context):
+        lines = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                lines.extend([' ', line] for line in a[i1:i2])
+            elif tag == 'replace' and i2 - i1 == j2 - j1 and \
+                i2 - i1 <= MAX_WORD_DIFF_LINES:
+                removed = []
+                added = []
+                for old_line, new_line in zip(a[i1:i2], b[j1:j2]):
+                    old_parts, new_parts = diff_words(old_line, new_line)
+                    removed.append(['-', old_line, old_parts])
+                    added.append(['+', new_line, new_parts])
+                lines.extend(removed + added)
+            else:
+                lines.extend(['-', line] for line in a[i1:i2])
+                lines.extend(['+', line] for line in b[j1:j2])
+        first, last = group[0], group[-1]
+        hunks.append({
+            'old_start': first[1] + 1,
+            'old_lines': last[2] - first[1],
+            'new_start': first[3] + 1,
+            'new_lines': last[4] - first[3],
+            'lines': lines,
+        })
+    return hunks
+
+def get_revision_diff(revision):
+    """
+        Returns the hunks between revision and its previous revision,
+        cached per pair of revisions. The contents of both are only
+        loaded if the diff isn't cached yet, so they may be deferred.
+    """
+    key = DIFF_KEY % (revision.previous_revision_id, revision.pk)
+    hunks = cache.get(key)
+    if hunks is None:
+        previous = revision.previous_revision
+        load_content([revision, previous])
+        hunks = diff_hunks(
+            previous.content if previous is not None else '',
+            revision.content
+        )
+        cache.set(key, hunks, settings.CACHE_TIMEOUT)
+    return hunks
@@ -5,6 +5,47 @@ from django.utils.translation import ugettext as _
 from wiki import models
 from wiki.forms import CreateForm, DeleteForm
 
+# used for titles without any characters valid in a slug
+FALLBACK_SLUG = 'article'
+
+def unique_slug(parent, slug):
+    """
+        Returns slug (or FALLBACK_SLUG if slug is empty), or that with the
+        lowest free number appended, so that it is unique among the
+        children of parent.
+
+        All possibly conflicting sibling slugs are fetched with a single
+        prefix query; the free suffix is then picked in memory.
+        Sibling slugs are unique across all spaces, since every space's
+        top level articles share the wiki root, so this can't be answered
+        by the space's path index.
+    """
+    slug = slug or FALLBACK_SLUG
+    max_length = models.URLPath.SLUG_MAX_LENGTH
+    # numbered candidates may cut off the end of a long slug, so query
+    # with a prefix short enough to cover them
+    prefix = slug[:max_length - 10]
+    taken = set(
+        s.lower() for s in models.URLPath.objects.filter(
+            parent=parent,
+            slug__istartswith=prefix
+        ).values_list('slug', flat=True)
+    )
+    return free_slug(slug, taken)
+
+def free_slug(slug, taken):
+    """
+        Returns slug, or slug with the lowest number appended, so that its
+        lowercase form isn't in the set taken.
+    """
+    max_length = models.URLPath.SLUG_MAX_LENGTH
+    start_slug = slug = slug[:max_length]
+    for x in itertools.count(1):
+        if slug.lower() not in taken:
+            break
+        slug = '%s%d' % (start_slug[:max_length - len(str(x))], x)
+    return slug
+
 class SpaceCreateForm(CreateForm):
     """
         Variant of wiki.forms.CreateForm. Makes slug optional and automatically
@@ -30,15 +71,10 @@ class SpaceCreateForm(CreateForm):
             if slug == 'admin':
                 raise forms.ValidationError(
                 _("'admin' is not a permitted slug name."))
-        max_length = models.URLPath.SLUG_MAX_LENGTH
-        start_slug = slug = slugify(slug)[:max_length]
-        for x in itertools.count(1):
-            if not models.URLPath.objects.filter(
-                slug__iexact=slug,
-                parent=self.urlpath_parent).exists():
-                break
-            slug = '%s%d' % (start_slug[:max_length - len(str(x))], x)
-        return slug
+        # kept for picking another slug if a concurrent request takes
+        # this one, see SpaceCreate.form_valid
+        self.requested_slug = slugify(slug)
+        return unique_slug(self.urlpath_parent, self.requested_slug)
 
 class SpaceDeleteForm(DeleteForm):
 
@@ -0,0 +1,227 @@
+"""
+    Opt-in timing of the phases of wiki requests.
+
+    Views decorated with instrumented() record the wall time and number of
+    queries of every phase of a request: resolving the article, checking
+    permissions, fetching children, building the table of contents,
+    rendering Markdown and rendering the template. Phases nest, and each
+    one only reports its own share; whatever isn't covered by a named
+    phase is reported as 'view'.
+
+    The timings of a request are sent as a Server-Timing header, logged to
+    the 'spaces_wiki.instrumentation' logger and kept as a sample in the
+    cache, where the dump_wiki_timings management command computes per
+    space percentiles from the most recent SAMPLE_SIZE samples.
+
+    Enable with SPACES_WIKI_INSTRUMENTATION = True. When disabled, the
+    decorators and phases only cost an attribute lookup.
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+INSTRUMENTATION = getattr(settings, 'SPACES_WIKI_INSTRUMENTATION', False)
+# number of recent samples kept per space
+SAMPLE_SIZE = getattr(settings, 'SPACES_WIKI_INSTRUMENTATION_SAMPLES', 500)
+SAMPLES_KEY = 'spaces_wiki:timings:%s'
+SPACES_KEY = 'spaces_wiki:timings:spaces'
+
+# request attribute holding the Timings of the request
+REQUEST_ATTR = '_spaces_wiki_timings'
+
+
+class Timings(object):
+    """
+        Self time and query count of the phases of a request.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        # name -> [seconds, queries]
+        self.phases = OrderedDict()
+        # [name, start, seconds spent in nested phases]
+        self.stack = []
+
+    def push(self, name):
+        self.phases.setdefault(name, [0.0, 0])
+        self.stack.append([name, time.perf_counter(), 0.0])
+
+    def pop(self):
+        name, start, nested = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        self.phases[name][0] += elapsed - nested
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def outer(self):
+        """
+            Returns the name of the phase surrounding the current one.
+        """
+        return self.stack[-2][0] if len(self.stack) > 1 else 'view'
+
+    def count_query(self, execute, sql, params, many, context):
+        if self.stack:
+            self.phases[self.stack[-1][0]][1] += 1
+        return execute(sql, params, many, context)
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def queries(self):
+        return sum(queries for seconds, queries in self.phases.values())
+
+    def header(self):
+        """
+            Returns the value of the Server-Timing header.
+        """
+        metrics = [
+            '%s;dur=%.2f;desc="%d queries"' % (name, seconds * 1000, queries)
+            for name, (seconds, queries) in self.phases.items()
+        ]
+        metrics.append('total;dur=%.2f;desc="%d queries"' % (
+            self.total() * 1000, self.queries()))
+        return ', '.join(metrics)
+
+
+def get_timings(request):
+    return getattr(request, REQUEST_ATTR, None)
+
+@contextmanager
+def phase(request, name):
+    """
+        Attributes the time and queries of the block to the phase name,
+        if the request is instrumented.
+    """
+    timings = get_timings(request)
+    if timings is None:
+        yield
+        return
+    timings.push(name)
+    try:
+        yield
+    finally:
+        timings.pop()
+
+def timed(name, decorator):
+    """
+        Wraps a view decorator, so that the time it spends before and after
+        calling the view is attributed to the phase name.
+    """
+    def wrap(func):
+        @wraps(func)
+        def resume(request, *args, **kwargs):
+            timings = get_timings(request)
+            if timings is None:
+                return func(request, *args, **kwargs)
+            with phase(request, timings.outer()):
+                return func(request, *args, **kwargs)
+        decorated = decorator(resume)
+
+        @wraps(func)
+        def inner(request, *args, **kwargs):
+            with phase(request, name):
+                return decorated(request, *args, **kwargs)
+        return inner
+    return wrap
+
+def instrumented(view_name):
+    """
+        View decorator recording the timings of the request, including the
+        rendering of a template response. Has to be the outermost
+        decorator.
+    """
+    def decorator(func):
+        @wraps(func)
+        def inner(request, *args, **kwargs):
+            if not INSTRUMENTATION:
+                return func(request, *args, **kwargs)
+            timings = Timings()
+            setattr(request, REQUEST_ATTR, timings)
+            with connection.execute_wrapper(timings.count_query):
+                with phase(request, 'view'):
+                    response = func(request, *args, **kwargs)
+                    if hasattr(response, 'render') and not response.is_rendered:
+                        with phase(request, 'template'):
+                            response.render()
+            response['Server-Timing'] = timings.header()
+            record_timings(request, view_name, timings)
+            return response
+        return inner
+    return decorator
+
+
+def record_timings(request, view_name, timings):
+    """
+        Logs the timings of a request and adds them to the samples of its
+        space.
+    """
+    space_id = request.SPACE.pk
+    sample = {
+        'view': view_name,
+        'total': timings.total() * 1000,
+        'queries': timings.queries(),
+        'phases': dict(
+            (name, seconds * 1000)
+            for name, (seconds, queries) in timings.phases.items()
+        ),
+    }
+    logger.info(
+        '%s %s: %.1fms, %d queries',
+        view_name,
+        request.path,
+        sample['total'],
+        sample['queries'],
+        extra={'space': space_id, 'timings': sample}
+    )
+    # samples of concurrent requests may get lost, which is fine for
+    # statistics
+    key = SAMPLES_KEY % space_id
+    samples = cache.get(key, [])
+    samples.append(sample)
+    cache.set(key, samples[-SAMPLE_SIZE:], None)
+    spaces = cache.get(SPACES_KEY, set())
+    if space_id not in spaces:
+        spaces.add(space_id)
+        cache.set(SPACES_KEY, spaces, None)
+
+def percentile(values, p):
+    """
+        Returns the p-th percentile of the sorted list values (nearest rank).
+    """
+    index = int(math.ceil(p / 100.0 * len(values))) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+def get_percentiles(space_id, percentiles=(50, 90, 99)):
+    """
+        Returns {view: {metric: {'p50': value, ..., 'count': samples}}}
+        for the recorded samples of a space, where metric is 'total',
+        'queries' or the name of a phase.
+    """
+    metrics = {}
+    for sample in cache.get(SAMPLES_KEY % space_id, []):
+        view = metrics.setdefault(sample['view'], {})
+        view.setdefault('total', []).append(sample['total'])
+        view.setdefault('queries', []).append(sample['queries'])
+        for name, value in sample['phases'].items():
+            view.setdefault(name, []).append(value)
+    result = {}
+    for view_name, view in metrics.items():
+        result[view_name] = {}
+        for name, values in view.items():
+            values.sort()
+            result[view_name][name] = dict(
+                ('p%d' % p, percentile(values, p)) for p in percentiles)
+            result[view_name][name]['count'] = len(values)
+    return result
+
+def get_recorded_spaces():
+    return sorted(cache.get(SPACES_KEY, set()))
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+
+from spaces_wiki.orphans import clean_orphans
+
+
+class Command(BaseCommand):
+    help = ('Removes the wiki articles, revisions and paths left behind by '
+            'deleted spaces. Every article below the wiki root is expected '
+            'to belong to a space.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be removed.'
+        )
+        parser.add_argument(
+            '--after',
+            type=int,
+            default=0,
+            help='Continue with the top level paths after this id, as '
+                 'printed by an interrupted run.'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Number of top level paths checked per batch (default: 100).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of articles removed per transaction (default: 100).'
+        )
+
+    def handle(self, *args, **options):
+        after = options['after']
+        totals = [0, 0, 0, 0]
+        while after is not None:
+            orphans, last = clean_orphans(
+                after=after,
+                limit=options['limit'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run']
+            )
+            for orphan in orphans:
+                self.stdout.write('%s: %d paths, %d revisions, %d bytes' % (
+                    orphan.urlpath.slug,
+                    orphan.urlpaths,
+                    orphan.revisions,
+                    orphan.size,
+                ))
+                totals[0] += 1
+                totals[1] += orphan.urlpaths
+                totals[2] += orphan.revisions
+                totals[3] += orphan.size
+            if last is not None:
+                self.stdout.write('Checked up to path %d.' % last)
+            after = last
+        self.stdout.write(
+            '%s %d orphaned subtrees: %d paths, %d revisions, %d bytes.' % (
+                ('Found' if options['dry_run'] else 'Removed',) + tuple(totals)
+            )
+        )
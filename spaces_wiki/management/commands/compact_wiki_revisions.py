@@ -0,0 +1,61 @@
+import datetime
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from spaces_wiki.models import WikiArticle
+from spaces_wiki.revisions import compact_revisions
+
+
+class Command(BaseCommand):
+    help = 'Squashes runs of revisions saved by the same author within a ' \
+           'short time. Revisions referenced by activity stream actions ' \
+           'are kept.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--space',
+            type=int,
+            action='append',
+            dest='spaces',
+            help='Only compact the articles of the space with this id. '
+                 'Can be given multiple times.'
+        )
+        parser.add_argument(
+            '--window',
+            type=int,
+            default=600,
+            help='Maximum number of seconds between two revisions of a run.'
+        )
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=30,
+            dest='days',
+            help='Only drop revisions older than this number of days.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many revisions would be dropped.'
+        )
+
+    def handle(self, *args, **options):
+        window = datetime.timedelta(seconds=options['window'])
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+        wikiarticles = WikiArticle.objects.select_related(
+            'article'
+        ).order_by('pk')
+        if options['spaces']:
+            wikiarticles = wikiarticles.filter(wiki__space__in=options['spaces'])
+        count = 0
+        for wikiarticle in wikiarticles.iterator():
+            count += compact_revisions(
+                wikiarticle,
+                window,
+                before,
+                dry_run=options['dry_run']
+            )
+        if options['dry_run']:
+            self.stdout.write('Would drop %d revisions.' % count)
+        else:
+            self.stdout.write('Dropped %d revisions.' % count)
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from spaces_wiki.deltas import SNAPSHOT_INTERVAL, compress_article, expand_revision
+from spaces_wiki.models import RevisionDelta, WikiArticle
+
+
+class Command(BaseCommand):
+    help = 'Converts old revisions of wiki articles to delta storage, ' \
+           'or back to full copies with --expand.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--space',
+            type=int,
+            action='append',
+            dest='spaces',
+            help='Only convert the articles of the space with this id. '
+                 'Can be given multiple times.'
+        )
+        parser.add_argument(
+            '--snapshot-interval',
+            type=int,
+            default=SNAPSHOT_INTERVAL,
+            help='Keep every n-th revision in full.'
+        )
+        parser.add_argument(
+            '--expand',
+            action='store_true',
+            help='Restore the full content of all delta-encoded revisions, '
+                 'e.g. before disabling SPACES_WIKI_DELTA_REVISIONS.'
+        )
+
+    def handle(self, *args, **options):
+        if options['expand']:
+            deltas = RevisionDelta.objects.select_related('revision')
+            if options['spaces']:
+                deltas = deltas.filter(
+                    revision__article__wikiarticle__wiki__space__in=options['spaces'])
+            count = 0
+            for delta in deltas.order_by('pk').iterator():
+                expand_revision(delta.revision)
+                count += 1
+            self.stdout.write('Expanded %d revisions.' % count)
+            return
+
+        wikiarticles = WikiArticle.objects.select_related(
+            'article'
+        ).order_by('pk')
+        if options['spaces']:
+            wikiarticles = wikiarticles.filter(wiki__space__in=options['spaces'])
+        count = 0
+        for wikiarticle in wikiarticles.iterator():
+            count += compress_article(
+                wikiarticle.article,
+                options['snapshot_interval']
+            )
+        self.stdout.write('Encoded %d revisions.' % count)
@@ -0,0 +1,46 @@
+import json
+from django.core.management.base import BaseCommand
+
+from spaces_wiki.instrumentation import get_percentiles, get_recorded_spaces
+
+PERCENTILES = (50, 90, 99)
+
+
+class Command(BaseCommand):
+    help = 'Prints percentiles of the recorded timings of wiki requests per space.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--space',
+            type=int,
+            action='append',
+            dest='spaces',
+            help='Only print the timings of the space with this id. '
+                 'Can be given multiple times.'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the percentiles as JSON.'
+        )
+
+    def handle(self, *args, **options):
+        spaces = options['spaces'] or get_recorded_spaces()
+        result = dict(
+            (space_id, get_percentiles(space_id, PERCENTILES))
+            for space_id in spaces
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2, sort_keys=True))
+            return
+        for space_id in spaces:
+            self.stdout.write('Space %s' % space_id)
+            for view_name, metrics in sorted(result[space_id].items()):
+                self.stdout.write('  %s (%d requests)' % (
+                    view_name, metrics['total']['count']))
+                for name, values in sorted(metrics.items()):
+                    unit = '' if name == 'queries' else 'ms'
+                    self.stdout.write('    %-12s %s' % (name, '  '.join(
+                        'p%d=%.1f%s' % (p, values['p%d' % p], unit)
+                        for p in PERCENTILES
+                    )))
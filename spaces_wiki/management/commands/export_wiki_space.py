@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from spaces.models import Space
+from spaces_wiki.transfer import export_space
+
+
+class Command(BaseCommand):
+    help = 'Exports the wiki of a space to a compressed archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('space', type=int, help='Id of the space.')
+        parser.add_argument('filename', help='Archive to write.')
+        parser.add_argument(
+            '--history',
+            action='store_true',
+            help='Export all revisions instead of only the current ones.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            space = Space.objects.get(pk=options['space'])
+        except Space.DoesNotExist:
+            raise CommandError('Space %s does not exist.' % options['space'])
+        with open(options['filename'], 'wb') as fileobj:
+            count = export_space(space, fileobj, history=options['history'])
+        self.stdout.write('Exported %d articles.' % count)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from spaces.models import Space
+from spaces_wiki.transfer import import_space
+
+
+class Command(BaseCommand):
+    help = 'Imports an archive written by export_wiki_space into a space. ' \
+           'No activity stream actions or notifications are created.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('space', type=int, help='Id of the space.')
+        parser.add_argument('filename', help='Archive to read.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of articles inserted at once.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            space = Space.objects.get(pk=options['space'])
+        except Space.DoesNotExist:
+            raise CommandError('Space %s does not exist.' % options['space'])
+        try:
+            count = import_space(
+                space,
+                options['filename'],
+                batch_size=options['batch_size']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Imported %d articles.' % count)
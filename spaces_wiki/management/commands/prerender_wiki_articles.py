@@ -0,0 +1,59 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.utils import translation
+
+from spaces_wiki.models import WikiArticle
+from spaces_wiki.rendering import RENDER_CACHE, get_render_key, render_article
+
+
+class Command(BaseCommand):
+    help = ('Renders the current revision of every article into the shared '
+            'render cache, e.g. after a deploy.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--space',
+            type=int,
+            action='append',
+            dest='spaces',
+            help='Only render articles of the space with this id. '
+                 'Can be given multiple times.'
+        )
+        parser.add_argument(
+            '--language',
+            action='append',
+            dest='languages',
+            help='Render for this language (default: LANGUAGE_CODE). '
+                 'Can be given multiple times.'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-render articles that are already cached.'
+        )
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+        wikiarticles = WikiArticle.objects.select_related(
+            'wiki',
+            'article__current_revision'
+        ).filter(
+            article__current_revision__deleted=False
+        ).order_by('pk')
+        if options['spaces']:
+            wikiarticles = wikiarticles.filter(wiki__space__in=options['spaces'])
+        cache = caches[RENDER_CACHE]
+        rendered = skipped = 0
+        for language in options['languages'] or [settings.LANGUAGE_CODE]:
+            with translation.override(language):
+                for wikiarticle in wikiarticles.iterator():
+                    article = wikiarticle.article
+                    space_id = wikiarticle.wiki.space_id
+                    if not options['force'] and \
+                        cache.get(get_render_key(article, space_id)) is not None:
+                        skipped += 1
+                        continue
+                    render_article(article, space_id)
+                    rendered += 1
+        self.stdout.write(
+            'Rendered %d articles, %d were already cached.' % (rendered, skipped))
@@ -0,0 +1,47 @@
+import time
+from django.core.management.base import BaseCommand
+
+from spaces_wiki.outbox import delete_old_events, process_events
+from spaces_wiki.trash import purge_pending
+
+
+class Command(BaseCommand):
+    help = ('Sends the activity stream actions and notification mails of '
+            'recorded wiki events, deletes old events and purges the articles '
+            'queued in the trash or left behind by deleted spaces in the '
+            'background.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and poll for new events.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=10,
+            help='Seconds to wait between polls in --loop mode (default: 10).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Maximum number of events sent per poll (default: 100).'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent = process_events(limit=options['batch_size'])
+            if sent:
+                self.stdout.write('Sent %d events.' % sent)
+            deleted = delete_old_events()
+            if deleted:
+                self.stdout.write('Deleted %d old events.' % deleted)
+            purged = purge_pending(limit=options['batch_size'])
+            if purged:
+                self.stdout.write('Purged %d articles.' % purged)
+            if not options['loop']:
+                break
+            if sent < options['batch_size']:
+                time.sleep(options['interval'])
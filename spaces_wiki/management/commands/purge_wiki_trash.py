@@ -0,0 +1,58 @@
+import datetime
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from spaces.models import Space
+from spaces_wiki.models import SpacesWiki
+from spaces_wiki.trash import purge_trash
+
+
+class Command(BaseCommand):
+    help = 'Permanently removes articles that have been in the trash for a while.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--space',
+            type=int,
+            action='append',
+            dest='spaces',
+            help='Only purge the trash of the space with this id. '
+                 'Can be given multiple times.'
+        )
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=30,
+            help='Only purge articles deleted more than this many days ago '
+                 '(default: 30).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of articles removed per transaction (default: 100).'
+        )
+
+    def handle(self, *args, **options):
+        deleted_before = timezone.now() - datetime.timedelta(days=options['older_than'])
+        spaces = Space.objects.filter(
+            pk__in=SpacesWiki.objects.values('space_id')
+        ).order_by('pk')
+        if options['spaces']:
+            spaces = spaces.filter(pk__in=options['spaces'])
+        total = 0
+        for space in spaces:
+            count, skipped = purge_trash(
+                space,
+                deleted_before=deleted_before,
+                batch_size=options['batch_size']
+            )
+            if count:
+                self.stdout.write('Space %s: purged %d articles.' % (space.pk, count))
+            if skipped:
+                self.stderr.write(
+                    'Space %s: skipped articles %s, which have articles of '
+                    'other spaces below them.' % (
+                        space.pk, ', '.join(str(pk) for pk in skipped)))
+            total += count
+        self.stdout.write('Purged %d articles.' % total)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from spaces_wiki.models import WikiArticle
+from spaces_wiki.search import index_article
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of all or some spaces.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--space',
+            type=int,
+            action='append',
+            dest='spaces',
+            help='Only rebuild the index of the space with this id. '
+                 'Can be given multiple times.'
+        )
+
+    def handle(self, *args, **options):
+        wikiarticles = WikiArticle.objects.select_related(
+            'wiki',
+            'article__current_revision'
+        ).order_by('pk')
+        if options['spaces']:
+            wikiarticles = wikiarticles.filter(wiki__space__in=options['spaces'])
+        count = 0
+        for wikiarticle in wikiarticles.iterator():
+            with transaction.atomic():
+                index_article(wikiarticle.article, wikiarticle.wiki.space_id)
+            count += 1
+        self.stdout.write('Indexed %d articles.' % count)
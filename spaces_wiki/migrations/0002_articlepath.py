@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def index_paths(apps, schema_editor):
+    """
+    Fills the path index for all existing space articles.
+    """
+    URLPath = apps.get_model('wiki', 'URLPath')
+    WikiArticle = apps.get_model('spaces_wiki', 'WikiArticle')
+    ArticlePath = apps.get_model('spaces_wiki', 'ArticlePath')
+    case_sensitive = getattr(settings, 'WIKI_URL_CASE_SENSITIVE', False)
+
+    nodes = {
+        pk: (parent_id, slug)
+        for pk, parent_id, slug in URLPath.objects.values_list(
+            'id', 'parent_id', 'slug')
+    }
+    paths = {}
+
+    def get_path(pk):
+        if pk not in paths:
+            parent_id, slug = nodes[pk]
+            if parent_id is None:
+                # the root doesn't show up in paths
+                paths[pk] = ''
+            else:
+                paths[pk] = '%s%s/' % (get_path(parent_id), slug)
+        return paths[pk]
+
+    spaces = dict(WikiArticle.objects.values_list('article_id', 'wiki__space_id'))
+    entries = []
+    for pk, article_id in URLPath.objects.filter(
+            article_id__in=spaces.keys()).values_list('id', 'article_id'):
+        path = get_path(pk)
+        entries.append(ArticlePath(
+            space_id=spaces[article_id],
+            path=path if case_sensitive else path.lower(),
+            urlpath_id=pk,
+            article_id=article_id,
+        ))
+    ArticlePath.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spaces', '0004_spaceplugin'),
+        ('wiki', '0001_initial'),
+        ('spaces_wiki', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticlePath',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1024)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wiki.Article')),
+                ('space', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='spaces.Space')),
+                ('urlpath', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='space_path', to='wiki.URLPath')),
+            ],
+            options={
+                'unique_together': {('space', 'path')},
+            },
+        ),
+        migrations.RunPython(index_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('spaces', '0004_spaceplugin'),
+        ('spaces_wiki', '0003_searchterm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WikiEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verb', models.CharField(choices=[('created', 'created'), ('modified', 'modified')], max_length=20)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('processed', models.DateTimeField(blank=True, null=True)),
+                ('space', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='spaces.Space')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('wikiarticle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='spaces_wiki.WikiArticle')),
+            ],
+            options={
+                'index_together': {('processed', 'updated')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0001_initial'),
+        ('spaces_wiki', '0004_wikievent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevisionDelta',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.TextField()),
+                ('base', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='wiki.ArticleRevision')),
+                ('revision', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='delta', to='wiki.ArticleRevision')),
+            ],
+        ),
+    ]
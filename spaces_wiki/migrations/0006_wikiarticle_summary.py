@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def copy_articles(apps, schema_editor):
+    """
+    Fills the copied article data of all existing WikiArticles with a
+    single UPDATE.
+    """
+    Article = apps.get_model('wiki', 'Article')
+    ArticlePath = apps.get_model('spaces_wiki', 'ArticlePath')
+    SpacesWiki = apps.get_model('spaces_wiki', 'SpacesWiki')
+    WikiArticle = apps.get_model('spaces_wiki', 'WikiArticle')
+    articles = Article.objects.filter(pk=OuterRef('article_id'))
+    paths = ArticlePath.objects.filter(article_id=OuterRef('article_id'))
+    WikiArticle.objects.update(
+        space=Subquery(SpacesWiki.objects.filter(
+            pk=OuterRef('wiki_id')).values('space_id')[:1]),
+        # articles without current revision or path
+        title=Coalesce(
+            Subquery(articles.values('current_revision__title')[:1]),
+            Value('')),
+        deleted=Coalesce(
+            Subquery(articles.values('current_revision__deleted')[:1]),
+            Value(False)),
+        path=Coalesce(
+            Subquery(paths.order_by('pk').values('path')[:1]),
+            Value('')),
+        modified=Subquery(articles.values('modified')[:1]),
+        owner=Subquery(articles.values('owner_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('spaces', '0004_spaceplugin'),
+        ('wiki', '0001_initial'),
+        ('spaces_wiki', '0005_revisiondelta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wikiarticle',
+            name='space',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='spaces.Space'),
+        ),
+        migrations.AddField(
+            model_name='wikiarticle',
+            name='title',
+            field=models.CharField(blank=True, default='', editable=False, max_length=512),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='wikiarticle',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=1024),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='wikiarticle',
+            name='deleted',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='wikiarticle',
+            name='modified',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='wikiarticle',
+            name='owner',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterIndexTogether(
+            name='wikiarticle',
+            index_together={('space', 'deleted', 'title'), ('space', 'deleted', 'modified')},
+        ),
+        # last, schema changes after updating rows fail on PostgreSQL
+        # ("pending trigger events")
+        migrations.RunPython(copy_articles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spaces_wiki', '0006_wikiarticle_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wikievent',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wikievent',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wikievent',
+            name='last_error',
+            field=models.TextField(blank=True),
+        ),
+    ]
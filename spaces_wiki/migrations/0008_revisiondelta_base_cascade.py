@@ -0,0 +1,18 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0001_initial'),
+        ('spaces_wiki', '0007_wikievent_attempts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='revisiondelta',
+            name='base',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wiki.ArticleRevision'),
+        ),
+    ]
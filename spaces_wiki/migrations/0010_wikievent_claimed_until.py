@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spaces_wiki', '0009_pendingpurge'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wikievent',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    SearchTerm = apps.get_model('spaces_wiki', 'SearchTerm')
+    duplicates = SearchTerm.objects.values('article', 'term').annotate(
+        first=Min('id'),
+        count=Count('id')
+    ).filter(count__gt=1)
+    for duplicate in duplicates.iterator():
+        SearchTerm.objects.filter(
+            article=duplicate['article'],
+            term=duplicate['term'],
+            id__gt=duplicate['first']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spaces_wiki', '0010_wikievent_claimed_until'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='searchterm',
+            unique_together={('article', 'term')},
+        ),
+    ]
@@ -1,53 +1,66 @@
 from django.http import Http404
 from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject
 from django.utils.translation import ugettext as _
-from django.views.generic.base import TemplateResponseMixin
 from wiki.conf import settings
 from wiki.core.plugins import registry
 import wiki.views.mixins as wiki_mixins
+from .cache import get_children
 from .decorators import article_owner_or_admin_required, article_owner_or_admin_required_for_restore
+from .instrumentation import phase, timed
+from .resolver import is_root, resolve_article
 
-def is_root(article):
-    """
-        Is the given article the root article? Returns True/False
-    """
-    return (article.urlpath_set.first().level == 0)
-
-class SpaceArticleMixin(TemplateResponseMixin):
+class SpaceArticleMixin(wiki_mixins.ArticleMixin):
 
     """ Gets children like wiki.views.mixins.ArticleMixin, but this variant is
     Space-aware.
+    Replaces ArticleMixin's dispatch and get_context_data, which fetch
+    the children on every request, and comes right before ArticleMixin
+    in the MRO of the Space* views.
     """
 
     def dispatch(self, request, article, *args, **kwargs):
-        if not is_root(article) and \
-            article.wikiarticle.wiki.space != request.SPACE:
+        self.urlpath = kwargs.pop('urlpath', None)
+        self.article = article
+        with phase(request, 'resolve'):
+            self.resolved_article = resolve_article(
+                request,
+                article,
+                urlpath=self.urlpath
+            )
+        if not self.resolved_article.is_root and \
+            self.resolved_article.space_id != request.SPACE.pk:
             raise Http404(_('Article does not exist'))
 
-        # only get children of the same space (mostly relevant for root)
-        self.children_slice = []
-        if settings.SHOW_MAX_CHILDREN > 0:
-            try:
-                for child in self.article.get_children(
-                        max_num=settings.SHOW_MAX_CHILDREN +
-                        1,
-                        articles__article__current_revision__deleted=False,
-                        articles__article__wikiarticle__wiki__space=\
-                            request.SPACE,
-                        user_can_read=request.user):
-                    self.children_slice.append(child)
-            except AttributeError as e:
-#                log.error(
-#                    "Attribute error most likely caused by wrong MPTT version. Use 0.5.3+.\n\n" +
-#                    str(e))
-                raise
-        return super(SpaceArticleMixin, self).dispatch(request, *args, **kwargs)
+        # only get children of the same space (mostly relevant for root).
+        # They're fetched lazily, as most requests (POSTs, previews, ...)
+        # never display them.
+        self.children_slice = SimpleLazyObject(self.get_space_children)
+        # skip ArticleMixin.dispatch
+        return super(wiki_mixins.ArticleMixin, self).dispatch(request, *args, **kwargs)
 
-    def get_context_data(self, **kwargs):
-        kwargs['children_slice'] = self.children_slice[:20]
-        kwargs['children_slice_more'] = len(self.children_slice) > 20
+    def get_space_children(self):
+        if settings.SHOW_MAX_CHILDREN <= 0 or self.urlpath is None:
+            return []
+        with phase(self.request, 'children'):
+            return get_children(
+                self.urlpath,
+                self.request.SPACE.pk,
+                self.request.user,
+                max_num=settings.SHOW_MAX_CHILDREN + 1
+            )
 
-        return kwargs
+    def get_context_data(self, **kwargs):
+        kwargs['urlpath'] = self.urlpath
+        kwargs['article'] = self.article
+        kwargs['article_tabs'] = registry.get_article_tabs()
+        kwargs['plugins'] = registry.get_plugins()
+        kwargs['children_slice'] = SimpleLazyObject(
+            lambda: self.children_slice[:20])
+        kwargs['children_slice_more'] = SimpleLazyObject(
+            lambda: len(self.children_slice) > 20)
+        # skip ArticleMixin.get_context_data
+        return super(wiki_mixins.ArticleMixin, self).get_context_data(**kwargs)
 
 
 class ArticlePermissionMixin(object):
@@ -55,7 +68,7 @@ class ArticlePermissionMixin(object):
     Deny access if user doesn't have sufficient permissions for
     editing wiki articles.
     """
-    @method_decorator(article_owner_or_admin_required)
+    @method_decorator(timed('permission', article_owner_or_admin_required))
     def dispatch(self, request, *args, **kwargs):
         return super(ArticlePermissionMixin, self).dispatch(request, *args, **kwargs)
 
@@ -64,7 +77,7 @@ class ArticleRestorePermissionMixin(object):
     Deny access if user doesn't have sufficient permissions for
     editing wiki articles.
     """
-    @method_decorator(article_owner_or_admin_required_for_restore)
+    @method_decorator(timed('permission', article_owner_or_admin_required_for_restore))
     def dispatch(self, request, *args, **kwargs):
         return super(ArticleRestorePermissionMixin, self).dispatch(request, *args, **kwargs)
 
@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
-from wiki.models.article import Article
+from wiki.conf import settings as wiki_settings
+from wiki.models.article import Article, ArticleRevision
+from wiki.models.urlpath import URLPath
 from spaces.models import Space,SpacePluginRegistry, SpacePlugin, SpaceModel
 
 # Create your models here.
@@ -9,27 +12,267 @@ class SpacesWiki(SpacePlugin):
     """
     Wiki/Note taking plugin for Spaces. This only provides general 
     metadata per space. Content is available in WikiArticle instances.
+
+    The top level articles of all spaces are children of the one wiki
+    root, so they share a single MPTT tree. Giving every space its own
+    tree would need a root node per space, but django-wiki allows only one
+    root per site: URLPath.root() raises MultipleRootURLs and
+    URLPath.clean() rejects a second one, and get_article() resolves every
+    path from that root.
     """
     # active field (boolean) inherited from SpacePlugin
     # space field (foreignkey) inherited from SpacePlugin
     reverse_url = 'spaces_wiki:root'
 
 class WikiArticle(SpaceModel):
+    """
+    An article of a space.
+
+    Besides the article and wiki, a copy of the data listings need is
+    kept here (space, current title, path, deleted flag, modification
+    time and owner), so listing and searching a space doesn't have to join
+    Article, ArticleRevision, URLPath and SpacesWiki. The copy is filled on
+    creation and kept up to date by the signal handlers in
+    spaces_wiki.signals.
+    """
     article = models.OneToOneField(Article, on_delete=models.CASCADE)
     wiki = models.ForeignKey(SpacesWiki, on_delete=models.CASCADE)
 
+    space = models.ForeignKey(
+        Space,
+        null=True,
+        editable=False,
+        on_delete=models.CASCADE
+    )
+    title = models.CharField(max_length=512, blank=True, editable=False)
+    # as stored in the path index, see ArticlePath.normalize
+    path = models.CharField(max_length=1024, blank=True, editable=False)
+    deleted = models.BooleanField(default=False, editable=False)
+    modified = models.DateTimeField(null=True, editable=False)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
+
     spaceplugin_field_name = "wiki"
 
     class Meta:
         verbose_name = _('article')
         verbose_name_plural = _('articles')
+        index_together = (
+            ('space', 'deleted', 'title'),
+            ('space', 'deleted', 'modified'),
+        )
 
     def __str__(self):
-        return self.article.__str__() 
+        return self.title or self.article.__str__()
+
+    def save(self, *args, **kwargs):
+        if self.pk is None:
+            self.space_id = self.wiki.space_id
+            self.copy_article(self.article)
+        super(WikiArticle, self).save(*args, **kwargs)
+
+    def copy_article(self, article):
+        revision = article.current_revision
+        if revision is not None:
+            self.title = revision.title
+            self.deleted = revision.deleted
+        self.modified = article.modified
+        self.owner_id = article.owner_id
+
+    @classmethod
+    def update_article(cls, article):
+        """
+        Copies the current state of article to its WikiArticle, if any.
+        """
+        copy = cls()
+        copy.copy_article(article)
+        cls.objects.filter(article=article).update(
+            title=copy.title,
+            deleted=copy.deleted,
+            modified=copy.modified,
+            owner_id=copy.owner_id
+        )
+
+    @classmethod
+    def update_paths(cls, urlpath):
+        """
+        Copies the indexed paths of the articles at and below urlpath,
+        e.g. after it was created or moved.
+        """
+        urlpaths = URLPath.objects.filter(
+            tree_id=urlpath.tree_id,
+            lft__gte=urlpath.lft,
+            rght__lte=urlpath.rght
+        )
+        paths = ArticlePath.objects.filter(
+            article_id=models.OuterRef('article_id')
+        ).order_by('pk').values('path')[:1]
+        cls.objects.filter(
+            article__in=urlpaths.values('article_id')
+        ).update(path=models.Subquery(paths))
 
     def get_absolute_url(self):
         return self.article.get_absolute_url()
 
+class ArticlePath(models.Model):
+    """
+    Space-aware index of article paths, mapping (space, full path) to an
+    article. Lets views look up articles of a space with a single indexed
+    query instead of walking the shared wiki tree slug by slug.
+    Kept up to date by the signal handlers in spaces_wiki.signals.
+    """
+    space = models.ForeignKey(Space, on_delete=models.CASCADE)
+    path = models.CharField(max_length=1024)
+    urlpath = models.OneToOneField(
+        URLPath,
+        on_delete=models.CASCADE,
+        related_name='space_path'
+    )
+    article = models.ForeignKey(Article, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('space', 'path')
+
+    def __str__(self):
+        return self.path
+
+    @staticmethod
+    def normalize(path):
+        """
+        Returns path in the form stored in the index: without leading
+        slash, with trailing slash, lowercased unless wiki urls are
+        case sensitive.
+        """
+        path = path.strip('/')
+        if path:
+            path += '/'
+        if not wiki_settings.URL_CASE_SENSITIVE:
+            path = path.lower()
+        return path
+
+    @classmethod
+    def index_subtree(cls, urlpath, space_id):
+        """
+        (Re-)indexes urlpath and all its descendants, e.g. after creating
+        or moving an article.
+        """
+        paths = {urlpath.pk: urlpath.path}
+        cls.objects.update_or_create(
+            urlpath=urlpath,
+            defaults={
+                'space_id': space_id,
+                'path': cls.normalize(paths[urlpath.pk]),
+                'article_id': urlpath.article_id,
+            }
+        )
+        descendants = urlpath.get_descendants().order_by('lft').values_list(
+            'id', 'parent_id', 'slug', 'article_id', 'article__wikiarticle'
+        )
+        for pk, parent_id, slug, article_id, wikiarticle_id in descendants:
+            paths[pk] = '%s%s/' % (paths[parent_id], slug)
+            # e.g. redirects left behind by moves aren't part of the space
+            if wikiarticle_id is None:
+                continue
+            cls.objects.update_or_create(
+                urlpath_id=pk,
+                defaults={
+                    'space_id': space_id,
+                    'path': cls.normalize(paths[pk]),
+                    'article_id': article_id,
+                }
+            )
+
+class SearchTerm(models.Model):
+    """
+    Posting of the space-partitioned full-text index: the weight of a term
+    in an article, i.e. its number of occurrences, with occurrences in the
+    title counting more. See spaces_wiki.search.
+    """
+    space = models.ForeignKey(Space, on_delete=models.CASCADE)
+    term = models.CharField(max_length=64)
+    article = models.ForeignKey(Article, on_delete=models.CASCADE)
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        index_together = (('space', 'term'),)
+        # a term is posted once per article, searches count matching terms
+        unique_together = (('article', 'term'),)
+
+class WikiEvent(models.Model):
+    """
+    Outbox entry for a wiki event whose activity stream action and
+    notification mails are sent by a background worker instead of the
+    request (see spaces_wiki.outbox). Consecutive edits of an article by
+    the same user are coalesced into one pending event.
+    """
+    CREATED = 'created'
+    MODIFIED = 'modified'
+    VERB_CHOICES = (
+        (CREATED, _('created')),
+        (MODIFIED, _('modified')),
+    )
+
+    verb = models.CharField(max_length=20, choices=VERB_CHOICES)
+    wikiarticle = models.ForeignKey(WikiArticle, on_delete=models.CASCADE)
+    space = models.ForeignKey(Space, on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        on_delete=models.SET_NULL
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    # time of the last coalesced edit
+    updated = models.DateTimeField(auto_now=True)
+    processed = models.DateTimeField(null=True, blank=True)
+    # attempts at sending the event, and when to try again after a failure
+    attempts = models.PositiveIntegerField(default=0)
+    retry_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    # a worker is sending the event until then
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        index_together = (('processed', 'updated'),)
+
+    def __str__(self):
+        return '%s %s' % (self.wikiarticle, self.verb)
+
+class RevisionDelta(models.Model):
+    """
+    Content of an old revision, stored as the difference to a revision
+    which still holds its full content (a snapshot). The revision's own
+    content field is emptied. See spaces_wiki.deltas.
+    """
+    revision = models.OneToOneField(
+        ArticleRevision,
+        on_delete=models.CASCADE,
+        related_name='delta'
+    )
+    # a delta is unreadable without its snapshot, and goes with it. Code
+    # deleting single revisions has to spare snapshots, see
+    # spaces_wiki.deltas.get_snapshot_ids
+    base = models.ForeignKey(
+        ArticleRevision,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    delta = models.TextField()
+
+class PendingPurge(models.Model):
+    """
+    An article queued for removal, together with everything below it, by
+    the background worker (see spaces_wiki.trash.purge_pending). Only its
+    id is kept, as the article may be gone by the time the queue is
+    processed.
+    """
+    article_id = models.IntegerField(db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+
 class WikiPlugin(SpacePluginRegistry):
     """
     Provide a wiki plugin for Spaces. This makes the SpacesWiki class visible 
@@ -38,4 +281,4 @@ class WikiPlugin(SpacePluginRegistry):
     name = 'spaces_wiki'
     title = _('Notebook')
     plugin_model = SpacesWiki
-    searchable_fields = (WikiArticle, ('article__current_revision__title', 'article__current_revision__content'))
\ No newline at end of file
+    searchable_fields = (WikiArticle, ('title', 'article__current_revision__content'))
\ No newline at end of file
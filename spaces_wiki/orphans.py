@@ -0,0 +1,109 @@
+"""
+    Cleanup of wiki data left behind by deleted spaces.
+
+    Deleting a space (or its SpacesWiki) only removes the WikiArticles;
+    the django-wiki articles, revisions and URLPaths stay in the shared
+    tree. A top level URLPath is an orphan if nothing in its subtree
+    belongs to a space or redirects to a live article, and it isn't
+    django-wiki's lost-and-found article.
+
+    Orphans are found with one query per candidate and removed subtree by
+    subtree through spaces_wiki.trash.purge_article, in batches of their
+    own transactions. Removal is idempotent, so an interrupted run simply
+    continues with the next one, or after a given URLPath id.
+
+    Deleting a SpacesWiki queues its own articles for the
+    process_wiki_events worker (see spaces_wiki.trash.purge_pending).
+    This scan of the whole tree is only run by the clean_wiki_orphans
+    command, e.g. for spaces deleted before that.
+"""
+from django.db.models import Q
+from wiki.conf import settings
+from wiki.models import ArticleRevision, URLPath
+
+from .models import RevisionDelta
+from .trash import purge_article
+
+
+class Orphan(object):
+    """
+        An orphaned subtree and the rows and bytes removing it reclaims.
+        Bytes are the UTF-8 encoded sizes of the revisions' titles,
+        contents and deltas.
+    """
+
+    def __init__(self, urlpath, urlpaths, revisions, size):
+        self.urlpath = urlpath
+        self.urlpaths = urlpaths
+        self.revisions = revisions
+        self.size = size or 0
+
+
+def get_subtree(urlpath):
+    return URLPath.objects.filter(
+        tree_id=urlpath.tree_id,
+        lft__gte=urlpath.lft,
+        rght__lte=urlpath.rght
+    )
+
+def find_orphans(after=0, limit=100):
+    """
+        Checks the next limit candidates, top level URLPaths with an id
+        greater than after. Returns the orphans among them and the id of
+        the last candidate, or None if there are no more candidates.
+    """
+    candidates = list(URLPath.objects.filter(
+        level=1,
+        pk__gt=after,
+        moved_to__isnull=True,
+        article__wikiarticle__isnull=True
+    ).exclude(
+        slug=settings.LOST_AND_FOUND_SLUG
+    ).select_related('article').order_by('pk')[:limit])
+    orphans = [
+        urlpath for urlpath in candidates
+        if not get_subtree(urlpath).filter(
+            Q(article__wikiarticle__isnull=False) |
+            # redirects to live articles; a removed target clears moved_to
+            Q(moved_to__isnull=False)
+        ).exists()
+    ]
+    last = candidates[-1].pk if len(candidates) == limit else None
+    return orphans, last
+
+def text_size(rows):
+    """
+        Returns the UTF-8 encoded size of the strings in rows.
+    """
+    return sum(len(text.encode('utf-8')) for row in rows for text in row if text)
+
+def measure_orphan(urlpath):
+    """
+        Returns the Orphan for urlpath, with four queries. Texts are
+        measured here, as databases differ in whether they count
+        characters or bytes.
+    """
+    subtree = get_subtree(urlpath)
+    revisions = ArticleRevision.objects.filter(
+        article__in=subtree.values('article_id')
+    )
+    size = text_size(revisions.values_list('title', 'content').iterator())
+    size += text_size(RevisionDelta.objects.filter(
+        revision__in=revisions
+    ).values_list('delta').iterator())
+    return Orphan(urlpath, subtree.count(), revisions.count(), size)
+
+def clean_orphans(after=0, limit=100, batch_size=100, dry_run=False):
+    """
+        Removes (or with dry_run, only measures) the orphans among the
+        next limit candidates after the URLPath id after.
+        Returns the list of Orphans and the id to continue after, or None
+        if all candidates were checked.
+    """
+    urlpaths, last = find_orphans(after, limit)
+    orphans = []
+    for urlpath in urlpaths:
+        orphans.append(measure_orphan(urlpath))
+        if not dry_run:
+            purge_article(urlpath.article, batch_size)
+    return orphans, last
@@ -0,0 +1,202 @@
+"""
+    Outbox for wiki events.
+
+    Views only record a WikiEvent row, in the same transaction as the
+    article change. The process_wiki_events management command later sends
+    the activity stream actions and notification mails of all events that
+    haven't been touched for EVENT_DELAY seconds, so quick successive edits
+    of the same user result in a single "modified" notification.
+
+    An event is claimed for CLAIM_TIMEOUT seconds in a short transaction of
+    its own and sent after that, so no row lock is held while mails go out.
+    It is marked as processed only once it was sent; if the worker dies in
+    between, the claim runs out and the event is sent again. If sending
+    fails, the error is logged and stored with the event, which is retried
+    after an exponentially growing delay, up to MAX_ATTEMPTS times; the
+    remaining events are sent in the meantime.
+
+    Processed events, and those that ran out of attempts, are deleted
+    after RETENTION days (see delete_old_events).
+"""
+import datetime
+import logging
+import traceback
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.db import transaction
+from django.db.models import F, Q
+from django.http import HttpRequest
+from django.utils import timezone
+from django.utils.translation import ugettext as _
+
+from actstream.signals import action as actstream_action
+from spaces_notifications.mixins import NotificationMixin
+from .models import WikiEvent
+
+logger = logging.getLogger(__name__)
+
+# seconds an event has to rest before it is sent; edits within this
+# window are coalesced
+EVENT_DELAY = getattr(settings, 'SPACES_WIKI_EVENT_DELAY', 60)
+# seconds to wait after the first failed attempt, doubled on every retry
+RETRY_DELAY = getattr(settings, 'SPACES_WIKI_EVENT_RETRY_DELAY', 60)
+MAX_ATTEMPTS = getattr(settings, 'SPACES_WIKI_EVENT_MAX_ATTEMPTS', 5)
+# seconds a worker has to send a claimed event
+CLAIM_TIMEOUT = getattr(settings, 'SPACES_WIKI_EVENT_CLAIM_TIMEOUT', 300)
+# days to keep processed and failed events
+RETENTION = getattr(settings, 'SPACES_WIKI_EVENT_RETENTION', 30)
+
+NOTIFICATION_LABELS = {
+    WikiEvent.CREATED: 'spaces_wiki_create',
+    WikiEvent.MODIFIED: 'spaces_wiki_modify',
+}
+
+
+class EventNotification(NotificationMixin):
+    """
+        Sends the notification mail of a WikiEvent outside of a request by
+        providing the view attributes NotificationMixin relies on, and a
+        request to the article on the current site.
+    """
+
+    def __init__(self, event):
+        article = event.wikiarticle.article
+        link = article.get_absolute_url()
+        self.request = HttpRequest()
+        self.request.method = 'POST'
+        self.request.path = self.request.path_info = link
+        self.request.META['HTTP_HOST'] = self.request.META['SERVER_NAME'] = \
+            Site.objects.get_current().domain
+        self.request.META['SERVER_PORT'] = '80'
+        self.request.user = event.user
+        self.request.SPACE = event.space
+        self.notification_label = NOTIFICATION_LABELS[event.verb]
+        self.notification_object_title = article
+        self.notification_object_link = link
+
+
+def record_event(verb, wikiarticle, user):
+    """
+        Records a wiki event. A modification is merged into a pending event
+        of the same user for the same article, which is then postponed.
+    """
+    if verb == WikiEvent.MODIFIED:
+        now = timezone.now()
+        # not into an event that is being sent
+        coalesced = WikiEvent.objects.filter(
+            Q(claimed_until__isnull=True) | Q(claimed_until__lte=now),
+            wikiarticle=wikiarticle,
+            user=user,
+            processed__isnull=True
+        ).update(updated=now)
+        if coalesced:
+            return
+    WikiEvent.objects.create(
+        verb=verb,
+        wikiarticle=wikiarticle,
+        space_id=wikiarticle.wiki.space_id,
+        user=user
+    )
+
+def send_event(event):
+    """
+        Creates the activity stream action and sends the notification
+        mails of an event.
+    """
+    verbs = {
+        WikiEvent.CREATED: _("was created"),
+        WikiEvent.MODIFIED: _("was modified"),
+    }
+    actstream_action.send(
+        sender=event.user,
+        verb=verbs[event.verb],
+        target=event.space,
+        action_object=event.wikiarticle,
+        timestamp=event.updated
+    )
+    EventNotification(event).send_notification()
+
+def claim_event(event):
+    """
+        Claims event for CLAIM_TIMEOUT seconds and counts the attempt,
+        unless another worker was faster.
+        Returns True if the event was claimed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        return bool(WikiEvent.objects.filter(
+            Q(claimed_until__isnull=True) | Q(claimed_until__lte=now),
+            pk=event.pk,
+            processed__isnull=True
+        ).update(
+            claimed_until=now + datetime.timedelta(seconds=CLAIM_TIMEOUT),
+            attempts=F('attempts') + 1
+        ))
+
+def complete_event(event):
+    """
+        Marks a claimed event as sent.
+    """
+    WikiEvent.objects.filter(pk=event.pk).update(
+        processed=timezone.now(),
+        claimed_until=None
+    )
+
+def release_event(event, error):
+    """
+        Returns a claimed event whose sending failed to the queue, to be
+        retried after a delay growing with the number of attempts.
+    """
+    attempts = event.attempts + 1
+    WikiEvent.objects.filter(pk=event.pk).update(
+        claimed_until=None,
+        retry_at=timezone.now() + datetime.timedelta(
+            seconds=RETRY_DELAY * 2 ** (attempts - 1)),
+        last_error=error
+    )
+
+def process_events(limit=100):
+    """
+        Sends up to limit due events. Safe to run in several workers at
+        once: each event is claimed before it is sent. An event that fails
+        to send is put back for a later retry and doesn't stop the others.
+        Returns the number of events sent.
+    """
+    now = timezone.now()
+    due = WikiEvent.objects.filter(
+        Q(retry_at__isnull=True) | Q(retry_at__lte=now),
+        Q(claimed_until__isnull=True) | Q(claimed_until__lte=now),
+        processed__isnull=True,
+        attempts__lt=MAX_ATTEMPTS,
+        updated__lte=now - datetime.timedelta(seconds=EVENT_DELAY)
+    ).select_related(
+        'wikiarticle__article__current_revision',
+        'space',
+        'user'
+    ).order_by('updated')[:limit]
+    sent = 0
+    for event in due:
+        if not claim_event(event):
+            continue
+        try:
+            send_event(event)
+        except Exception:
+            logger.exception('Sending wiki event %d failed', event.pk)
+            release_event(event, traceback.format_exc())
+            continue
+        complete_event(event)
+        sent += 1
+    return sent
+
+def delete_old_events(days=RETENTION):
+    """
+        Deletes the events processed more than days ago, and those which
+        ran out of attempts and haven't changed since then.
+        Returns the number of deleted events.
+    """
+    before = timezone.now() - datetime.timedelta(days=days)
+    deleted, _rows = WikiEvent.objects.filter(
+        Q(processed__lt=before) |
+        Q(processed__isnull=True, attempts__gte=MAX_ATTEMPTS, updated__lt=before)
+    ).delete()
+    return deleted
@@ -0,0 +1,106 @@
+"""
+    Cached space permissions of a user.
+
+    What a user may do in a space is evaluated once into a SpacePermissions
+    snapshot, which is memoized on the user object for the rest of the
+    request and cached across requests. Cache keys contain a version per
+    space, bumped when object permissions on the space change, and a
+    global version, bumped when group memberships, user permissions or
+    groups change (see the signal handlers in spaces_wiki.signals), so
+    changed roles take effect on the next request.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from collab.util import is_owner_or_admin
+from guardian.core import ObjectPermissionChecker
+from .cache import bump_version, get_version
+
+PERMISSIONS_TIMEOUT = getattr(
+    settings, 'SPACES_WIKI_PERMISSIONS_TIMEOUT', 60 * 60)
+SPACE_VERSION_KEY = 'spaces_wiki:permissions_version:%s'
+GLOBAL_VERSION_KEY = 'spaces_wiki:permissions_version'
+PERMISSIONS_KEY = 'spaces_wiki:permissions:%s:%s:%s:%s'
+
+# user attribute memoizing the snapshots of a request
+USER_ATTR = '_spaces_wiki_permissions'
+
+
+class SpacePermissions(object):
+    """
+        Snapshot of a user's permissions in a space.
+        access: may access the space ('access_space')
+        admin: is a space administrator or manager
+        moderate: is a wiki moderator ('wiki.moderate')
+    """
+
+    def __init__(self, access, admin, moderate):
+        self.access = access
+        self.admin = admin
+        self.moderate = moderate
+
+    def is_owner_or_admin(self, user, owner_id):
+        """
+            May user modify or delete an object owned by owner_id?
+        """
+        return user.is_authenticated and (owner_id == user.pk or self.admin)
+
+
+def bump_space_permissions(space_id):
+    """
+        Invalidates the cached permissions of all users in a space.
+    """
+    bump_version(SPACE_VERSION_KEY % space_id)
+
+def bump_all_permissions():
+    """
+        Invalidates the cached permissions of all users in all spaces.
+    """
+    bump_version(GLOBAL_VERSION_KEY)
+
+def get_permissions_version(space_id):
+    """
+        Returns a token that changes whenever the cached permissions of
+        users in the space are invalidated.
+    """
+    return '%s-%s' % (
+        get_version(SPACE_VERSION_KEY % space_id),
+        get_version(GLOBAL_VERSION_KEY),
+    )
+
+def evaluate_permissions(user, space):
+    """
+        Evaluates the permissions of user in space, without caching.
+    """
+    return SpacePermissions(
+        access=ObjectPermissionChecker(user).has_perm('access_space', space),
+        # collab's check for objects the user doesn't own
+        admin=user.is_authenticated and is_owner_or_admin(user, None, space),
+        moderate=user.has_perm('wiki.moderate'),
+    )
+
+def get_space_permissions(user, space):
+    """
+        Returns the SpacePermissions of user in space, from the request's
+        memo or the cache if possible.
+    """
+    memo = getattr(user, USER_ATTR, None)
+    if memo is None:
+        memo = {}
+        setattr(user, USER_ATTR, memo)
+    permissions = memo.get(space.pk)
+    if permissions is None:
+        # the user's flags are part of the key, so they don't need
+        # invalidating
+        key = PERMISSIONS_KEY % (
+            space.pk,
+            get_permissions_version(space.pk),
+            user.pk,
+            '%d%d' % (user.is_active, user.is_superuser),
+        )
+        permissions = cache.get(key)
+        if permissions is None:
+            permissions = evaluate_permissions(user, space)
+            cache.set(key, permissions, PERMISSIONS_TIMEOUT)
+        memo[space.pk] = permissions
+    return permissions
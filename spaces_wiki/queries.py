@@ -0,0 +1,99 @@
+from django.db.models import Q
+from wiki.models import URLPath
+
+from .models import ArticlePath
+
+
+class SpaceChild(object):
+    """
+        Lightweight, cacheable stand-in for a child URLPath in listings.
+    """
+
+    def __init__(self, article_id, title, path, has_children):
+        self.article_id = article_id
+        self.title = title
+        self.path = path
+        self.has_children = has_children
+
+    def __str__(self):
+        return self.title
+
+def space_children(urlpath, space_id, user=None, max_num=None):
+    """
+        Returns the non-deleted children of urlpath within a space as a
+        list of SpaceChild, ordered by title, with a single query.
+        Filters and sorts on WikiArticle's copies of title and deleted
+        flag, which are indexed per space.
+    """
+    children = URLPath.objects.filter(
+        parent=urlpath,
+        article__wikiarticle__space_id=space_id,
+        article__wikiarticle__deleted=False,
+    )
+    if user is not None:
+        children = children.can_read(user)
+    rows = children.order_by('article__wikiarticle__title').values_list(
+        'article_id',
+        'article__wikiarticle__title',
+        'article__wikiarticle__path',
+        'lft',
+        'rght',
+    )
+    if max_num:
+        rows = rows[:max_num]
+    return [
+        # mptt: any node with children spans more than two numbers
+        SpaceChild(article_id, title, path, rght - lft > 1)
+        for article_id, title, path, lft, rght in rows
+    ]
+
+def space_directory(urlpath, space, user=None, query=None):
+    """
+        Returns the visible children of urlpath that belong to the given
+        space, ordered by title.
+
+        Deleted articles are excluded in SQL, so paginating the result
+        yields correct counts. Everything the directory templates display
+        (title, deleted/locked flags, modification date, parent for
+        building the path) is fetched with the rows themselves, so
+        rendering a page costs a constant number of queries.
+    """
+    children = URLPath.objects.filter(
+        parent=urlpath,
+        article__wikiarticle__space=space,
+        article__wikiarticle__deleted=False,
+    )
+    if user is not None:
+        children = children.can_read(user)
+    if query:
+        children = children.filter(
+            Q(article__wikiarticle__title__icontains=query) |
+            Q(slug__icontains=query))
+    return children.select_related(
+        'parent',
+        'article',
+        'article__current_revision',
+    ).defer(
+        # listings never show the article body, which can be large
+        'article__current_revision__content',
+    ).order_by('article__wikiarticle__title')
+
+def get_space_urlpath(space, path):
+    """
+        Looks up the URLPath of a space's article by its full path with a
+        single query on the path index, joining in article, owner, current
+        revision, WikiArticle and SpacesWiki.
+        An empty path returns the wiki root.
+        Raises URLPath.DoesNotExist for unknown paths.
+    """
+    path = ArticlePath.normalize(path)
+    if not path:
+        return URLPath.root()
+    return URLPath.objects.select_related(
+        'article__current_revision',
+        'article__owner',
+        'article__wikiarticle__wiki',
+    ).get(
+        space_path__space=space,
+        space_path__path=path
+    )
@@ -0,0 +1,123 @@
+"""
+    Recently changed articles of a space.
+
+    Every space has a capped list of its RECENT_SIZE most recently changed,
+    non-deleted articles in the cache, newest first. Saving an article
+    moves it to the front of the list (or drops it, if it was deleted), so
+    reading the list never sorts the space's articles. If the list isn't
+    cached, it is rebuilt with a single query on WikiArticle's
+    (space, deleted, modified) index.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from wiki.models import Article
+
+from .models import WikiArticle
+
+RECENT_SIZE = getattr(settings, 'SPACES_WIKI_RECENT_SIZE', 50)
+RECENT_KEY = 'spaces_wiki:recent:%s'
+LOCK_KEY = 'spaces_wiki:recent_lock:%s'
+DIRTY_KEY = 'spaces_wiki:recent_dirty:%s'
+# seconds a writer may hold the lock of a list
+LOCK_TIMEOUT = 10
+
+
+def build_recent_changes(space_id):
+    """
+        Returns the list of recently changed articles of a space, as dicts
+        with the keys 'article', 'title', 'path', 'user' (username of the
+        last author or None) and 'modified'.
+    """
+    rows = WikiArticle.objects.filter(
+        space_id=space_id,
+        deleted=False
+    ).order_by('-modified').values_list(
+        'article_id',
+        'title',
+        'path',
+        'article__current_revision__user__username',
+        'modified',
+    )[:RECENT_SIZE]
+    return [
+        {
+            'article': article_id,
+            'title': title,
+            'path': path,
+            'user': username,
+            'modified': modified,
+        } for article_id, title, path, username, modified in rows
+    ]
+
+def get_recent_changes(space_id, count=RECENT_SIZE, user=None):
+    """
+        Returns the count most recently changed articles of a space, from
+        the cache if possible. If user is given, only the articles user
+        may read are included, which costs one query.
+    """
+    key = RECENT_KEY % space_id
+    changes = cache.get(key)
+    if changes is None:
+        changes = build_recent_changes(space_id)
+        # a change committed while building may be missing
+        if cache.add(key, changes, None) and cache.get(DIRTY_KEY % space_id):
+            cache.delete_many([key, DIRTY_KEY % space_id])
+    if user is not None and not user.has_perm('wiki.moderate'):
+        readable = set(Article.objects.filter(
+            pk__in=[change['article'] for change in changes]
+        ).can_read(user).values_list('pk', flat=True))
+        changes = [change for change in changes if change['article'] in readable]
+    return changes[:count]
+
+def update_recent_changes(space_id, article):
+    """
+        Moves article to the front of its space's list, or removes it if
+        it was deleted. If another process is updating the list at the same
+        time, or a reader is rebuilding it, the list is dropped and
+        rebuilt on the next read instead, so no update gets lost.
+    """
+    key = RECENT_KEY % space_id
+    lock = LOCK_KEY % space_id
+    dirty = DIRTY_KEY % space_id
+    if not cache.add(lock, True, LOCK_TIMEOUT):
+        # the lock holder drops its result if it sees the flag
+        cache.set(dirty, True, LOCK_TIMEOUT)
+        cache.delete(key)
+        return
+    try:
+        changes = cache.get(key)
+        if changes is None:
+            # tell readers currently rebuilding the list
+            cache.set(dirty, True, LOCK_TIMEOUT)
+            return
+        changes = [change for change in changes if change['article'] != article.pk]
+        revision = article.current_revision
+        if revision is not None and not revision.deleted:
+            changes.insert(0, {
+                'article': article.pk,
+                'title': revision.title,
+                'path': WikiArticle.objects.filter(
+                    article=article
+                ).values_list('path', flat=True).first(),
+                'user': revision.user.get_username() if revision.user else None,
+                'modified': article.modified,
+            })
+        cache.set(key, changes[:RECENT_SIZE], None)
+        if cache.get(dirty):
+            cache.delete_many([key, dirty])
+    finally:
+        cache.delete(lock)
+
+def record_change(space_id, article):
+    """
+        Updates the list of recent changes when the current transaction
+        commits.
+    """
+    transaction.on_commit(lambda: update_recent_changes(space_id, article))
+
+def clear_recent_changes(space_id):
+    """
+        Drops the list of a space, e.g. after paths changed or articles
+        were removed.
+    """
+    cache.delete(RECENT_KEY % space_id)
@@ -0,0 +1,60 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import translation
+from django.utils.safestring import mark_safe
+from wiki.core.plugins import registry
+
+# name of the cache backend shared by all workers
+RENDER_CACHE = getattr(settings, 'SPACES_WIKI_RENDER_CACHE', 'default')
+# rendered content is addressed by its source, so it never gets stale
+# and can be kept around for long
+RENDER_CACHE_TIMEOUT = getattr(
+    settings, 'SPACES_WIKI_RENDER_CACHE_TIMEOUT', 60 * 60 * 24 * 7)
+RENDER_KEY = 'spaces_wiki:render:%s:%s:%s:%s:%s'
+
+
+def get_render_key(article, space_id):
+    """
+        Returns the cache key of an article's rendered current revision.
+        It is derived from the revision's content, the set of active wiki
+        plugins, the space and the article (for relative links), so equal
+        input always maps to the same entry, across workers and deploys.
+    """
+    revision = article.current_revision
+    content_hash = hashlib.sha1(revision.content.encode('utf-8')).hexdigest()
+    plugins_hash = hashlib.sha1(
+        ','.join(sorted(registry.get_plugins().keys())).encode('utf-8')
+    ).hexdigest()[:12]
+    return RENDER_KEY % (
+        space_id,
+        article.pk,
+        plugins_hash,
+        translation.get_language(),
+        content_hash,
+    )
+
+def render_article(article, space_id):
+    """
+        Renders the current revision of article and stores it in the
+        render cache.
+    """
+    content = article.render()
+    caches[RENDER_CACHE].set(
+        get_render_key(article, space_id),
+        content,
+        RENDER_CACHE_TIMEOUT
+    )
+    return content
+
+def get_rendered_content(article, space_id):
+    """
+        Returns the rendered current revision of article, from the render
+        cache if possible.
+    """
+    if article.current_revision is None:
+        return ''
+    content = caches[RENDER_CACHE].get(get_render_key(article, space_id))
+    if content is None:
+        content = render_article(article, space_id)
+    return mark_safe(content)
@@ -0,0 +1,116 @@
+from django.http import Http404
+from django.utils.translation import ugettext as _
+from wiki.models import URLPath
+
+from .models import WikiArticle
+from .permissions import get_space_permissions
+from .queries import get_space_urlpath
+
+# request attribute holding the ResolvedArticle instances of a request
+REQUEST_ATTR = '_spaces_wiki_articles'
+
+
+class ResolvedArticle(object):
+    """
+        Everything views, decorators and template tags need to know about
+        a requested article: URLPath, Article, WikiArticle, space, owner and
+        current revision. Loaded once per request by resolve_article().
+    """
+
+    def __init__(self, article, urlpath=None, wikiarticle=None):
+        self.article = article
+        self.urlpath = urlpath
+        self.wikiarticle = wikiarticle
+        self.current_revision = article.current_revision
+        self.owner = article.owner
+        self.space_id = wikiarticle.wiki.space_id if wikiarticle else None
+
+    @property
+    def is_root(self):
+        if self.urlpath is not None:
+            return self.urlpath.level == 0
+        return is_root(self.article)
+
+    def is_owner_or_admin(self, user, space):
+        """
+            collab.util.is_owner_or_admin for this article's owner, based
+            on the cached permissions of user.
+        """
+        return get_space_permissions(user, space).is_owner_or_admin(
+            user,
+            self.article.owner_id
+        )
+
+
+def is_root(article):
+    """
+        Is the given article the root article? Returns True/False
+    """
+    return (article.urlpath_set.first().level == 0)
+
+def get_resolved_article(request, article_id):
+    """
+        Returns the ResolvedArticle already loaded for article_id during
+        this request, or None.
+    """
+    return getattr(request, REQUEST_ATTR, {}).get(article_id)
+
+def resolve_article(request, article=None, urlpath=None, path=None):
+    """
+        Returns the ResolvedArticle for the given article, urlpath or path,
+        loading it at most once per request.
+
+        If urlpath comes from wiki's get_article decorator, article, owner
+        and current revision are already joined in and only WikiArticle and
+        SpacesWiki are fetched, with a single query. A path is looked up in
+        the space's path index, joining in everything at once.
+    """
+    joined = False
+    if article is None and urlpath is None:
+        try:
+            urlpath = get_space_urlpath(request.SPACE, path or '')
+        except URLPath.DoesNotExist:
+            raise Http404(_('Article does not exist'))
+        joined = urlpath.level > 0
+    if article is None:
+        article = urlpath.article
+
+    resolved_articles = getattr(request, REQUEST_ATTR, None)
+    if resolved_articles is None:
+        resolved_articles = {}
+        setattr(request, REQUEST_ATTR, resolved_articles)
+    resolved = resolved_articles.get(article.pk)
+    if resolved is not None:
+        if resolved.urlpath is None and urlpath is not None:
+            resolved.urlpath = urlpath
+        return resolved
+
+    if joined:
+        wikiarticle = article.wikiarticle
+    else:
+        wikiarticle = WikiArticle.objects.select_related('wiki').filter(
+            article_id=article.pk
+        ).first()
+        if wikiarticle is not None:
+            # prime the reverse relation, so article.wikiarticle is free
+            article.wikiarticle = wikiarticle
+    resolved = ResolvedArticle(article, urlpath, wikiarticle)
+    resolved_articles[article.pk] = resolved
+    return resolved
+
+def get_user_role(request, article):
+    """
+        Returns the role of the requesting user for article: 'anonymous',
+        'owner', 'admin' (space administrator or manager), 'moderator' or
+        'member'. Used to key cached fragments that depend on permissions.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return 'anonymous'
+    if article.owner_id == user.pk:
+        return 'owner'
+    if resolve_article(request, article).is_owner_or_admin(user, request.SPACE):
+        return 'admin'
+    if user.has_perm('wiki.moderate'):
+        return 'moderator'
+    return 'member'
@@ -0,0 +1,131 @@
+import bisect
+import datetime
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from actstream.models import Action
+from wiki.models import ArticleRevision
+
+from .deltas import get_snapshot_ids
+
+# seconds within which consecutive revisions of the same author are merged
+# into one when saving. 0 disables coalescing.
+COALESCE_WINDOW = getattr(settings, 'SPACES_WIKI_COALESCE_WINDOW', 0)
+
+
+def can_merge(older, newer, window):
+    """
+        Can older be dropped in favour of its successor newer?
+        Both have to be by the same (known) author, created within window
+        of each other, and must not differ in their deleted/locked state.
+        The first revision of an article is always kept.
+    """
+    return (
+        older.previous_revision_id is not None and
+        older.user_id is not None and
+        older.user_id == newer.user_id and
+        older.deleted == newer.deleted and
+        older.locked == newer.locked and
+        newer.created - older.created <= window
+    )
+
+def get_referenced_revision_ids(wikiarticle, revisions):
+    """
+        Returns the ids of those revisions which were the latest ones when
+        an activity stream action about wikiarticle was created.
+        revisions has to be ordered by creation.
+    """
+    timestamps = Action.objects.filter(
+        action_object_content_type=ContentType.objects.get_for_model(wikiarticle),
+        action_object_object_id=str(wikiarticle.pk)
+    ).values_list('timestamp', flat=True)
+    created = [revision.created for revision in revisions]
+    referenced = set()
+    for timestamp in timestamps:
+        i = bisect.bisect_right(created, timestamp)
+        if i:
+            referenced.add(revisions[i - 1].pk)
+    return referenced
+
+def merge_revisions(removed, kept):
+    """
+        Deletes the revisions in removed, moving their plugin data to
+        kept, which takes their place in the revision chain.
+    """
+    ids = [revision.pk for revision in removed]
+    # like wiki's MergeView, keep the plugin data of merged revisions
+    kept.simpleplugin_set.model.objects.filter(
+        article_revision__in=ids
+    ).update(article_revision=kept)
+    ArticleRevision.objects.filter(pk__in=ids).delete()
+
+def coalesce_revision(revision, window=None):
+    """
+        Merges revision's predecessor into revision if it is by the same
+        author, within the coalescing window and not referenced by an
+        activity stream action, nor the snapshot of delta-encoded
+        revisions. Returns True if revisions were merged.
+    """
+    if window is None:
+        window = datetime.timedelta(seconds=COALESCE_WINDOW)
+    older = revision.previous_revision
+    if not window or older is None or not can_merge(older, revision, window):
+        return False
+    wikiarticle = revision.article.wikiarticle
+    if older.pk in get_referenced_revision_ids(wikiarticle, [older, revision]):
+        return False
+    if older.pk in get_snapshot_ids(older.article_id):
+        return False
+    with transaction.atomic():
+        revision.previous_revision = older.previous_revision
+        if not revision.user_message:
+            revision.user_message = older.user_message
+        revision.save(update_fields=['previous_revision', 'user_message'])
+        merge_revisions([older], revision)
+    return True
+
+@transaction.atomic
+def compact_revisions(wikiarticle, window, before, dry_run=False):
+    """
+        Squashes runs of consecutive revisions of wikiarticle that have
+        the same author and follow each other within window, keeping the
+        last revision of each run. Only revisions created before the
+        datetime before are dropped; the current revision, the first one,
+        snapshots of delta-encoded revisions and those referenced by
+        activity stream actions are always kept.
+        Returns the number of revisions dropped.
+    """
+    article = wikiarticle.article
+    revisions = list(
+        article.articlerevision_set.order_by('created').defer('content')
+    )
+    protected = get_referenced_revision_ids(wikiarticle, revisions)
+    protected.add(article.current_revision_id)
+    protected.update(get_snapshot_ids(article.pk))
+    kept = []
+    # kept revision id -> revisions merged into it
+    merged = {}
+    for revision in revisions:
+        if kept:
+            older = kept[-1]
+            if older.pk not in protected and older.created < before and \
+                can_merge(older, revision, window):
+                kept.pop()
+                merged[revision.pk] = merged.pop(older.pk, []) + [older]
+        kept.append(revision)
+    if dry_run or not merged:
+        return sum(len(removed) for removed in merged.values())
+
+    # relink the chain of remaining revisions
+    previous = None
+    for revision in kept:
+        previous_id = previous.pk if previous else None
+        if revision.previous_revision_id != previous_id:
+            ArticleRevision.objects.filter(pk=revision.pk).update(
+                previous_revision=previous_id)
+        previous = revision
+    revisions = {revision.pk: revision for revision in kept}
+    for pk, removed in merged.items():
+        merge_revisions(removed, revisions[pk])
+    return sum(len(removed) for removed in merged.values())
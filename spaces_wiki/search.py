@@ -0,0 +1,73 @@
+import re
+from collections import Counter
+from django.db import transaction
+from django.db.models import Count, Sum
+from wiki.models import Article
+
+from .models import SearchTerm
+
+TOKEN_RE = re.compile(r'\w+')
+# occurrences in the title count this much more than in the body
+TITLE_WEIGHT = 10
+
+
+def tokenize(text):
+    """
+        Splits text into lowercase search terms.
+    """
+    max_length = SearchTerm._meta.get_field('term').max_length
+    return [
+        token[:max_length] for token in TOKEN_RE.findall(text.lower())
+        if len(token) > 1
+    ]
+
+def get_postings(article, space_id):
+    """
+        Returns the unsaved postings of article's current revision.
+    """
+    revision = article.current_revision
+    if revision is None or revision.deleted:
+        return []
+    weights = Counter(tokenize(revision.content))
+    for term in tokenize(revision.title):
+        weights[term] += TITLE_WEIGHT
+    return [
+        SearchTerm(space_id=space_id, term=term, article=article, weight=weight)
+        for term, weight in weights.items()
+    ]
+
+def index_article(article, space_id):
+    """
+        Replaces the postings of article with ones built from its current
+        revision. Deleted articles are just removed from the index.
+        Concurrent re-indexes of the same article wait for each other on
+        the article's row lock.
+    """
+    with transaction.atomic():
+        list(Article.objects.select_for_update().filter(
+            pk=article.pk).values_list('pk', flat=True))
+        SearchTerm.objects.filter(article=article).delete()
+        SearchTerm.objects.bulk_create(
+            get_postings(article, space_id),
+            batch_size=500
+        )
+
+def search(space, query, user=None):
+    """
+        Returns the ids and scores of the space's articles containing all
+        terms of query, best matches first, as a values queryset that can
+        be paginated. If user is given, only the articles user may read
+        are included.
+    """
+    terms = set(tokenize(query or ''))
+    if not terms:
+        return SearchTerm.objects.none().values('article')
+    postings = SearchTerm.objects.filter(space=space, term__in=terms)
+    if user is not None:
+        postings = postings.filter(article__in=Article.objects.can_read(user))
+    return postings.values('article').annotate(
+        matches=Count('id'),
+        score=Sum('weight')
+    ).filter(
+        matches=len(terms)
+    ).order_by('-score', 'article')
@@ -13,4 +13,165 @@ def create_notice_types(sender, **kwargs):
             'spaces_wiki_modify',
             _('An article has been modified.'),
             _('An article has been modified.')
-        )
\ No newline at end of file
+        )
+
+def create_root(sender, **kwargs):
+    """
+        django-wiki needs a root page. It is created after migrations
+        (and flushes) rather than on every process start.
+        create_root emulates get_or_create, so this only creates a new
+        root if none exists yet.
+    """
+    from collab.util import db_table_exists, db_table_column_exists
+    from wiki.models import URLPath
+    if db_table_exists('django_site'):
+        # the following condition was needed for a wiki migration of wiki 0.3.1
+        if db_table_column_exists('wiki_urlpath', 'moved_to_id'):
+            URLPath.create_root()
+
+def get_space_id(article_id):
+    """
+        Returns the id of the space an article belongs to, or None if the
+        article isn't part of a space (e.g. the wiki root).
+    """
+    from .models import WikiArticle
+    return WikiArticle.objects.filter(
+        article_id=article_id
+    ).values_list('space_id', flat=True).first()
+
+def article_saved(sender, instance, **kwargs):
+    """
+        Article saved (new revision, revision switched, deleted or
+        restored): update its WikiArticle and the search index and
+        invalidate the cached tree of its space.
+    """
+    if kwargs.get('raw', False):
+        return
+    from .cache import bump_tree_version
+    from .models import WikiArticle
+    from .recent import record_change
+    from .search import index_article
+    space_id = get_space_id(instance.pk)
+    if space_id is not None:
+        WikiArticle.update_article(instance)
+        index_article(instance, space_id)
+        record_change(space_id, instance)
+        bump_tree_version(space_id)
+
+def article_changed(sender, instance, **kwargs):
+    """
+        Article about to be deleted: invalidate the cached tree and recent
+        changes of its space. Index entries are removed by cascading.
+    """
+    if kwargs.get('raw', False):
+        return
+    from .cache import bump_tree_version
+    from .recent import clear_recent_changes
+    space_id = get_space_id(instance.pk)
+    if space_id is not None:
+        bump_tree_version(space_id)
+        clear_recent_changes(space_id)
+
+def urlpath_saved(sender, instance, **kwargs):
+    """
+        URLPath created or moved: update the path index and invalidate the
+        cached tree and recent changes of its space.
+    """
+    if kwargs.get('raw', False):
+        return
+    from .cache import bump_tree_version
+    from .models import ArticlePath, WikiArticle
+    from .recent import clear_recent_changes
+    space_id = get_space_id(instance.article_id)
+    if space_id is not None:
+        ArticlePath.index_subtree(instance, space_id)
+        WikiArticle.update_paths(instance)
+        bump_tree_version(space_id)
+        clear_recent_changes(space_id)
+
+def urlpath_changed(sender, instance, **kwargs):
+    """
+        URLPath deleted: invalidate the cached tree of its space.
+        Index entries are removed by cascading.
+    """
+    if kwargs.get('raw', False):
+        return
+    from .cache import bump_tree_version
+    space_id = get_space_id(instance.article_id)
+    if space_id is not None:
+        bump_tree_version(space_id)
+
+def wikiarticle_saved(sender, instance, **kwargs):
+    """
+        An article was added to a space: index its paths and contents.
+    """
+    if kwargs.get('raw', False):
+        return
+    from wiki.models import URLPath
+    from .cache import bump_tree_version
+    from .models import ArticlePath, WikiArticle
+    from .recent import record_change
+    from .search import index_article
+    space_id = instance.wiki.space_id
+    for urlpath in URLPath.objects.filter(article_id=instance.article_id):
+        ArticlePath.index_subtree(urlpath, space_id)
+        WikiArticle.update_paths(urlpath)
+    index_article(instance.article, space_id)
+    bump_tree_version(space_id)
+    record_change(space_id, instance.article)
+
+def wikiarticle_changed(sender, instance, **kwargs):
+    """
+        An article was removed from a space.
+    """
+    if kwargs.get('raw', False):
+        return
+    from .cache import bump_tree_version
+    from .models import SpacesWiki
+    from .recent import clear_recent_changes
+    space_id = SpacesWiki.objects.filter(
+        pk=instance.wiki_id
+    ).values_list('space_id', flat=True).first()
+    if space_id is not None:
+        bump_tree_version(space_id)
+        clear_recent_changes(space_id)
+
+def object_permission_changed(sender, instance, **kwargs):
+    """
+        A user's or group's object permission was granted or revoked: if it
+        is a permission on a space, invalidate the cached permissions of
+        that space.
+    """
+    if kwargs.get('raw', False):
+        return
+    from spaces.models import Space
+    from .permissions import bump_space_permissions
+    if instance.content_type.model_class() is Space:
+        bump_space_permissions(instance.object_pk)
+
+def memberships_changed(sender, action=None, **kwargs):
+    """
+        Group memberships, permissions of users or groups changed, or a
+        group was deleted: invalidate all cached permissions.
+    """
+    if action is not None and not action.startswith('post_'):
+        return
+    from .permissions import bump_all_permissions
+    bump_all_permissions()
+
+def wiki_deleting(sender, instance, **kwargs):
+    """
+        A space's wiki is about to be deleted, which leaves its articles
+        behind in the shared tree: queue its topmost articles, together
+        with everything below them, for the background worker.
+    """
+    from wiki.models import URLPath
+    from .models import PendingPurge
+    article_ids = URLPath.objects.filter(
+        article__wikiarticle__wiki=instance
+    ).exclude(
+        parent__article__wikiarticle__wiki=instance
+    ).values_list('article_id', flat=True)
+    PendingPurge.objects.bulk_create([
+        PendingPurge(article_id=article_id) for article_id in article_ids
+    ])
@@ -0,0 +1,70 @@
+/*
+  Renders the diff hunks returned by spaces_wiki's diff view into the
+  table of a history entry. Further hunks are fetched on demand.
+*/
+function get_diff_json(url, put_in_element) {
+  var table = $(put_in_element).find('table');
+  if (table.find('tbody').length > 0) {
+    // already loaded
+    return;
+  }
+  load_diff_hunks(url, 0, table);
+}
+
+function load_diff_hunks(url, offset, table) {
+  $.getJSON(url, {offset: offset}, function(data) {
+    var tbody = $('<tbody></tbody>');
+    $.each(data.other_changes, function(i, change) {
+      var row = $('<tr class="equal"><td class="linenumber"></td><td class="linenumber"></td><td></td></tr>');
+      row.children('td').eq(2).text(change[0] + ': ' + change[1]);
+      tbody.append(row);
+    });
+    $.each(data.hunks, function(i, hunk) {
+      var old_number = hunk.old_start;
+      var new_number = hunk.new_start;
+      var header = $('<tr class="equal"><td class="linenumber"></td><td class="linenumber"></td><td></td></tr>');
+      header.children('td').eq(2).text(
+        '@@ -' + hunk.old_start + ',' + hunk.old_lines +
+        ' +' + hunk.new_start + ',' + hunk.new_lines + ' @@');
+      tbody.append(header);
+      $.each(hunk.lines, function(j, line) {
+        var row = $('<tr><td class="linenumber"></td><td class="linenumber"></td><td></td></tr>');
+        var cells = row.children('td');
+        if (line[0] == '-') {
+          row.addClass('delete');
+          cells.eq(0).text(old_number++);
+        } else if (line[0] == '+') {
+          row.addClass('insert');
+          cells.eq(1).text(new_number++);
+        } else {
+          row.addClass('equal');
+          cells.eq(0).text(old_number++);
+          cells.eq(1).text(new_number++);
+        }
+        if (line.length > 2) {
+          // word level changes
+          $.each(line[2], function(k, part) {
+            var span = $('<span></span>').text(part[1]);
+            if (part[0]) {
+              span.addClass('changed');
+            }
+            cells.eq(2).append(span);
+          });
+        } else {
+          cells.eq(2).text(line[1]);
+        }
+        tbody.append(row);
+      });
+    });
+    table.append(tbody);
+    if (data.next !== null) {
+      var more = $('<tbody><tr class="equal"><td colspan="3"><a href="#"></a></td></tr></tbody>');
+      more.find('a').text(table.attr('data-more-label')).click(function(e) {
+        e.preventDefault();
+        more.remove();
+        load_diff_hunks(url, data.next, table);
+      });
+      table.append(more);
+    }
+  });
+}
@@ -1,5 +1,11 @@
 from django import template
-from collab.util import is_owner_or_admin
+from django.contrib.auth.models import AnonymousUser
+from spaces_wiki.instrumentation import phase
+from spaces_wiki.permissions import get_space_permissions
+from spaces_wiki.recent import RECENT_SIZE, get_recent_changes
+from spaces_wiki.rendering import get_rendered_content
+from spaces_wiki.resolver import get_resolved_article
+from spaces_wiki.signals import get_space_id
 
 register = template.Library()
 
@@ -9,9 +15,46 @@ def hidden_if_not_owner(user, obj, space):
     Returns "disabled" if user is not allowed to modify/delete a post, else ''.
     Useful for disabling dom elements.
 
+    Based on the user's cached space permissions, so calling it repeatedly
+    per page is cheap.
+
     Usage:
     {% disabled_if_not_owner user file space %}
     """
-    return '' if is_owner_or_admin(user, obj.owner, space) else 'display:none;'
+    allowed = get_space_permissions(user, space).is_owner_or_admin(
+        user,
+        obj.owner_id
+    )
+    return '' if allowed else 'display:none;'
+
+@register.simple_tag(takes_context=True)
+def render_article(context, article):
+    """
+    Returns the rendered current revision of article from the shared render
+    cache, rendering it on a miss.
 
+    Usage:
+    {% render_article article %}
+    """
+    request = context.get('request')
+    resolved = get_resolved_article(request, article.pk) if request else None
+    if resolved is not None:
+        space_id = resolved.space_id
+    else:
+        space_id = get_space_id(article.pk)
+    with phase(request, 'markdown'):
+        return get_rendered_content(article, space_id)
 
+@register.simple_tag(takes_context=True)
+def recent_wiki_changes(context, space, count=10):
+    """
+    Returns the count most recently changed articles of space the user may
+    read, from the space's cached list. See spaces_wiki.recent for the
+    keys of the entries.
+
+    Usage:
+    {% recent_wiki_changes space 5 as changes %}
+    """
+    request = context.get('request')
+    user = request.user if request else context.get('user', AnonymousUser())
+    return get_recent_changes(space.pk, min(count, RECENT_SIZE), user)
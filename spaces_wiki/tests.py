@@ -1,3 +1,1612 @@
-from django.test import TestCase
+import datetime
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+import threading
+import tracemalloc
+from io import StringIO
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.exceptions import PermissionDenied
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import IntegrityError, connection, connections, transaction
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone, translation
+from django.utils.text import slugify
+from actstream.models import Action
+from guardian.shortcuts import assign_perm, remove_perm
+from wiki.conf import settings as wiki_settings
+from wiki.models import Article, ArticleRevision, SimplePlugin, URLPath
+
+from spaces.models import Space
+from .conditional import article_condition
+from .diffs import diff_hunks, get_revision_diff
+from .forms import unique_slug
+from .deltas import apply_delta, compress_article, load_content, make_delta
+from .permissions import get_space_permissions
+from .orphans import clean_orphans
+from .outbox import claim_event, delete_old_events, process_events
+from .recent import get_recent_changes, update_recent_changes
+from .rendering import RENDER_CACHE, get_render_key, get_rendered_content
+from .revisions import coalesce_revision, compact_revisions
+from .models import ArticlePath, PendingPurge, RevisionDelta, SearchTerm, SpacesWiki, WikiArticle, WikiEvent
+from .queries import space_directory
+from .search import index_article, search
+from . import instrumentation, views
+from .transfer import export_space, import_space
+from .trash import get_trash, purge_pending, purge_trash, restore_articles, schedule_purge
+from .cache import build_toc, get_permission_group, get_toc
+
+# set to run the (slow) benchmarks
+BENCHMARKS = os.environ.get('SPACES_WIKI_BENCHMARKS')
+
+
+def create_article(parent, slug, wiki, title=None, **revision_kwargs):
+    """
+        Creates an article below parent and adds it to the given wiki,
+        like SpaceCreate does.
+    """
+    urlpath = URLPath.create_urlpath(
+        parent,
+        slug,
+        title=title or slug,
+        **revision_kwargs
+    )
+    WikiArticle.objects.create(article=urlpath.article, wiki=wiki)
+    return urlpath
+
+
+def add_revision(urlpath, **kwargs):
+    """
+        Adds a new revision to urlpath's article, like the edit view does.
+    """
+    revision = ArticleRevision()
+    revision.inherit_predecessor(urlpath.article)
+    for key, value in kwargs.items():
+        setattr(revision, key, value)
+    urlpath.article.add_revision(revision)
+    return revision
+
+
+def make_request(user, space, method='get', data=None):
+    """
+        Returns a request of user in space, with session and messages.
+    """
+    request = getattr(RequestFactory(), method)('/', data or {})
+    request.user = user
+    request.SPACE = space
+    request.session = SessionStore()
+    request._messages = FallbackStorage(request)
+    return request
+
+
+class SpaceWikiTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = URLPath.create_root()
+        cls.space = Space.objects.create(name='Test space')
+        cls.wiki, _ = SpacesWiki.objects.get_or_create(space=cls.space)
+        cls.user = get_user_model().objects.create_user(
+            'member', 'member@example.com', 'secret')
+
+
+def toc_paths(toc):
+    """
+        Returns the paths in a table of contents, in order.
+    """
+    paths = []
+    for node in toc:
+        paths.append(node['path'])
+        paths.extend(toc_paths(node['children']))
+    return paths
+
+
+class TocTests(SpaceWikiTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.parent = create_article(self.root, 'parent', self.wiki)
+        self.child = create_article(self.parent, 'child', self.wiki)
+        get_toc(self.space.pk)
+
+    def assertRebuilt(self, paths):
+        with self.assertNumQueries(1):
+            toc = get_toc(self.space.pk)
+        self.assertEqual(toc_paths(toc), paths)
+
+    def test_hit(self):
+        with self.assertNumQueries(0):
+            toc = get_toc(self.space.pk)
+        self.assertEqual(toc_paths(toc), ['parent/', 'parent/child/'])
+
+    def test_create(self):
+        create_article(self.root, 'new', self.wiki)
+        self.assertRebuilt(['parent/', 'parent/child/', 'new/'])
+
+    def test_move(self):
+        URLPath.objects.get(pk=self.child.pk).move_to(self.root, 'last-child')
+        self.assertRebuilt(['parent/', 'child/'])
+
+    def test_delete(self):
+        Article.objects.get(pk=self.child.article_id).delete()
+        self.assertRebuilt(['parent/'])
+
+    def test_permission_change(self):
+        article = Article.objects.get(pk=self.parent.article_id)
+        article.other_read = False
+        article.save()
+        self.assertRebuilt(['parent/', 'parent/child/'])
+
+
+class SpaceDirectoryQueryTests(SpaceWikiTestCase):
+    """
+        Listing a directory must cost the same number of queries no matter
+        how many children it has.
+    """
+    sizes = (10,)
+
+    @classmethod
+    def setUpTestData(cls):
+        super(SpaceDirectoryQueryTests, cls).setUpTestData()
+        cls.directories = {}
+        for size in cls.sizes:
+            parent = create_article(cls.root, 'dir-%d' % size, cls.wiki)
+            for i in range(size):
+                create_article(parent, 'child-%d' % i, cls.wiki)
+            deleted = create_article(parent, 'deleted', cls.wiki)
+            add_revision(deleted, deleted=True)
+            cls.directories[size] = parent
+
+    def assertConstantQueries(self, size):
+        parent = URLPath.objects.get(pk=self.directories[size].pk)
+        # ancestors of the listed directory are fetched once per page
+        parent.cached_ancestors
+        with self.assertNumQueries(2):
+            page = Paginator(
+                space_directory(parent, self.space, user=self.user),
+                30
+            ).page(1)
+            for urlpath in page:
+                urlpath.set_cached_ancestors_from_parent(parent)
+                urlpath.path
+                urlpath.article.current_revision.title
+                urlpath.article.current_revision.deleted
+                urlpath.article.modified
+        # deleted articles are filtered in SQL, so counts are correct
+        self.assertEqual(page.paginator.count, size)
+
+    def test_directory_10(self):
+        self.assertConstantQueries(10)
+
+
+@skipUnless(BENCHMARKS, 'benchmarks are disabled')
+class SpaceDirectoryBenchmark(SpaceDirectoryQueryTests):
+    sizes = (10, 1000, 10000)
+
+    def test_directory_1000(self):
+        self.assertConstantQueries(1000)
+
+    def test_directory_10000(self):
+        self.assertConstantQueries(10000)
+
+
+class ArticlePathTests(SpaceWikiTestCase):
+
+    def setUp(self):
+        self.parent = create_article(self.root, 'parent', self.wiki)
+        self.child = create_article(self.parent, 'child', self.wiki)
+        self.grandchild = create_article(self.child, 'grandchild', self.wiki)
+        self.target = create_article(self.root, 'target', self.wiki)
+
+    def paths(self):
+        return dict(ArticlePath.objects.filter(space=self.space).values_list(
+            'urlpath_id', 'path'))
+
+    def test_move(self):
+        URLPath.objects.get(pk=self.child.pk).move_to(
+            URLPath.objects.get(pk=self.target.pk), 'last-child')
+        self.assertEqual(self.paths(), {
+            self.parent.pk: 'parent/',
+            self.target.pk: 'target/',
+            self.child.pk: 'target/child/',
+            self.grandchild.pk: 'target/child/grandchild/',
+        })
+        self.assertEqual(ArticlePath.objects.get(
+            space=self.space, path='target/child/grandchild/'
+        ).article_id, self.grandchild.article_id)
+
+    def test_delete(self):
+        Article.objects.get(pk=self.child.article_id).delete()
+        self.assertEqual(self.paths(), {
+            self.parent.pk: 'parent/',
+            self.target.pk: 'target/',
+        })
+
+
+class SearchTests(SpaceWikiTestCase):
+
+    def search(self, query):
+        return [result['article'] for result in search(self.space, query)]
+
+    def test_unique_postings(self):
+        urlpath = create_article(self.root, 'apples', self.wiki, content='apple')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SearchTerm.objects.create(
+                space=self.space, term='apple', article=urlpath.article, weight=1)
+        # re-indexing replaces the postings
+        index_article(Article.objects.get(pk=urlpath.article_id), self.space.pk)
+        self.assertEqual(self.search('apple'), [urlpath.article_id])
+
+    def test_ranking_follows_edits(self):
+        apples = create_article(self.root, 'apples', self.wiki,
+            title='Apples', content='apple pie and apple juice')
+        pie = create_article(self.root, 'pie', self.wiki,
+            title='Pie', content='apple pie')
+        create_article(self.root, 'pears', self.wiki,
+            title='Pears', content='pear juice')
+        # title matches rank higher
+        self.assertEqual(
+            self.search('Apple PIE'),
+            [pie.article_id, apples.article_id]
+        )
+        add_revision(apples, title='Apple pie')
+        self.assertEqual(
+            self.search('apple pie'),
+            [apples.article_id, pie.article_id]
+        )
+        add_revision(pie, deleted=True)
+        self.assertEqual(self.search('apple pie'), [apples.article_id])
+
+    def test_readable(self):
+        public = create_article(self.root, 'public', self.wiki, content='secret')
+        hidden = create_article(self.root, 'hidden', self.wiki, content='secret')
+        Article.objects.filter(pk=hidden.article_id).update(
+            other_read=False, group_read=False)
+        # the paginator doesn't count hidden matches either
+        paginator = Paginator(search(self.space, 'secret', self.user), 25)
+        self.assertEqual(paginator.count, 1)
+        self.assertEqual(
+            [result['article'] for result in paginator.page(1)],
+            [public.article_id]
+        )
+
+    def test_partitioned_by_space(self):
+        other_space = Space.objects.create(name='Other space')
+        other_wiki, _ = SpacesWiki.objects.get_or_create(space=other_space)
+        create_article(self.root, 'other', other_wiki, content='secret')
+        self.assertEqual(self.search('secret'), [])
+
+
+@skipUnless(BENCHMARKS, 'benchmarks are disabled')
+class SearchBenchmark(SpaceWikiTestCase):
+    articles = 100000
+    terms_per_article = 20
+    vocabulary = ['term%d' % i for i in range(5000)]
+
+    @classmethod
+    def setUpTestData(cls):
+        super(SearchBenchmark, cls).setUpTestData()
+        Article.objects.bulk_create(
+            [Article() for i in range(cls.articles)], batch_size=1000)
+        ids = Article.objects.order_by('-pk').values_list(
+            'pk', flat=True)[:cls.articles]
+        postings = []
+        for pk in ids:
+            for term in random.sample(cls.vocabulary, cls.terms_per_article):
+                postings.append(SearchTerm(
+                    space=cls.space,
+                    term=term,
+                    article_id=pk,
+                    weight=random.randint(1, 20)
+                ))
+            if len(postings) > 10000:
+                SearchTerm.objects.bulk_create(postings)
+                postings = []
+        SearchTerm.objects.bulk_create(postings)
+
+    def test_query_time(self):
+        for query in ('term1', 'term2 term3', 'term4 term5 term6'):
+            start = time.perf_counter()
+            paginator = Paginator(search(self.space, query), 25)
+            paginator.count
+            list(paginator.page(1))
+            elapsed = time.perf_counter() - start
+            self.assertLess(elapsed, 0.05, '%r took %.3fs' % (query, elapsed))
+
+
+def edit_content(content, i):
+    """
+        Simulates an edit of a notebook: changes one paragraph and appends
+        another one.
+    """
+    lines = content.splitlines(True)
+    if lines:
+        lines[i * 7 % len(lines)] = 'Edited paragraph %d.\n' % i
+    lines.append('Paragraph %d: %s\n' % (i, 'lorem ipsum ' * 20))
+    return ''.join(lines)
+
+
+class RenderCacheTests(SpaceWikiTestCase):
+
+    def setUp(self):
+        self.render_cache = caches[RENDER_CACHE]
+        self.render_cache.clear()
+        self.urlpath = create_article(self.root, 'page', self.wiki, content='First')
+
+    def get_key(self, language=settings.LANGUAGE_CODE):
+        article = Article.objects.select_related('current_revision').get(
+            pk=self.urlpath.article_id)
+        with translation.override(language):
+            return get_render_key(article, self.space.pk)
+
+    def test_keys(self):
+        key = self.get_key()
+        self.assertNotEqual(self.get_key('de'), self.get_key('fr'))
+        self.assertNotEqual(self.get_key('de'), key)
+        add_revision(self.urlpath, content='Second')
+        self.assertNotEqual(self.get_key(), key)
+        # entries are addressed by content, reverting reuses the old one
+        add_revision(self.urlpath, content='First')
+        self.assertEqual(self.get_key(), key)
+
+    def test_cached(self):
+        article = Article.objects.get(pk=self.urlpath.article_id)
+        content = get_rendered_content(article, self.space.pk)
+        self.assertIn('First', content)
+        with mock.patch.object(Article, 'render') as render:
+            self.assertEqual(get_rendered_content(article, self.space.pk), content)
+        render.assert_not_called()
+
+    def test_prerender_command(self):
+        create_article(self.root, 'other', self.wiki, content='Other')
+        deleted = create_article(self.root, 'deleted', self.wiki)
+        add_revision(deleted, deleted=True)
+        out = StringIO()
+        call_command('prerender_wiki_articles', '--space', str(self.space.pk),
+                     stdout=out)
+        self.assertIn('Rendered 2 articles, 0 were already cached.', out.getvalue())
+        self.assertIsNotNone(self.render_cache.get(self.get_key()))
+        out = StringIO()
+        call_command('prerender_wiki_articles', stdout=out)
+        self.assertIn('Rendered 0 articles, 2 were already cached.', out.getvalue())
+
+
+class DeltaTests(SpaceWikiTestCase):
+
+    def test_roundtrip(self):
+        base = 'a\nb\nc\n'
+        for content in ('', 'a\nb\nc\n', 'x\na\nc\nd', 'completely new'):
+            self.assertEqual(apply_delta(base, make_delta(base, content)), content)
+
+    def test_compress_and_load(self):
+        urlpath = create_article(self.root, 'notes', self.wiki, content='')
+        contents = ['']
+        for i in range(30):
+            contents.append(edit_content(contents[-1], i))
+            add_revision(urlpath, content=contents[-1])
+        article = Article.objects.get(pk=urlpath.article.pk)
+        self.assertGreater(compress_article(article, snapshot_interval=10), 0)
+        # every delta refers to a revision with full content
+        self.assertFalse(RevisionDelta.objects.filter(base__content='').exclude(
+            base__revision_number=1).exists())
+        revisions = list(article.articlerevision_set.order_by('revision_number'))
+        with self.assertNumQueries(1):
+            load_content(revisions)
+        self.assertEqual([r.content for r in revisions], contents)
+
+    def test_delete_article(self):
+        # e.g. from the admin or django-wiki's own purge
+        urlpath = create_article(self.root, 'notes', self.wiki, content='')
+        content = ''
+        for i in range(5):
+            content = edit_content(content, i)
+            add_revision(urlpath, content=content)
+        article = Article.objects.get(pk=urlpath.article.pk)
+        self.assertGreater(compress_article(article, snapshot_interval=3), 0)
+        article.delete()
+        self.assertFalse(RevisionDelta.objects.exists())
+
+
+@skipUnless(BENCHMARKS, 'benchmarks are disabled')
+class DeltaBenchmark(SpaceWikiTestCase):
+    revisions = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        super(DeltaBenchmark, cls).setUpTestData()
+        cls.urlpath = create_article(cls.root, 'notebook', cls.wiki, content='')
+        content = ''
+        for i in range(cls.revisions):
+            content = edit_content(content, i)
+            add_revision(cls.urlpath, content=content)
+
+    def get_size(self):
+        revisions = ArticleRevision.objects.filter(article=self.urlpath.article)
+        return sum(len(r.content) for r in revisions) + sum(
+            len(d.delta) for d in RevisionDelta.objects.all())
+
+    def test_size_and_latency(self):
+        before = self.get_size()
+        article = Article.objects.get(pk=self.urlpath.article.pk)
+        compress_article(article)
+        after = self.get_size()
+        self.assertLess(after, before / 5, 'stored %d of %d bytes' % (after, before))
+
+        revisions = list(article.articlerevision_set.all())
+        for revision in random.sample(revisions, 50):
+            start = time.perf_counter()
+            load_content([revision])
+            elapsed = time.perf_counter() - start
+            self.assertLess(elapsed, 0.05, 'revision %d took %.3fs' % (
+                revision.revision_number, elapsed))
+
+
+class RevisionCompactionTests(SpaceWikiTestCase):
+
+    window = datetime.timedelta(seconds=600)
+
+    def setUp(self):
+        self.other = get_user_model().objects.create_user(
+            'other', 'other@example.com', 'secret')
+        self.urlpath = create_article(self.root, 'notes', self.wiki, content='start')
+        self.start = timezone.now() - datetime.timedelta(days=60)
+        ArticleRevision.objects.filter(article=self.urlpath.article).update(
+            created=self.start - datetime.timedelta(days=1))
+
+    def revise(self, seconds, user=None, **kwargs):
+        """
+            Adds a revision by user (or self.user) created the given
+            number of seconds after self.start.
+        """
+        kwargs.setdefault('content', 'after %d seconds' % seconds)
+        revision = add_revision(self.urlpath, user=user or self.user, **kwargs)
+        ArticleRevision.objects.filter(pk=revision.pk).update(
+            created=self.start + datetime.timedelta(seconds=seconds))
+        return ArticleRevision.objects.get(pk=revision.pk)
+
+    def compact(self, before=None, **kwargs):
+        return compact_revisions(
+            WikiArticle.objects.get(article=self.urlpath.article),
+            self.window,
+            before or timezone.now(),
+            **kwargs
+        )
+
+    def assertChain(self, expected):
+        """
+            The article's revisions are expected, in a valid chain ending
+            with the current revision.
+        """
+        article = Article.objects.get(pk=self.urlpath.article_id)
+        revisions = list(article.articlerevision_set.order_by('created'))
+        self.assertEqual([r.pk for r in revisions], [r.pk for r in expected])
+        self.assertIsNone(revisions[0].previous_revision_id)
+        for older, newer in zip(revisions, revisions[1:]):
+            self.assertEqual(newer.previous_revision_id, older.pk)
+        self.assertEqual(article.current_revision_id, revisions[-1].pk)
+
+    def test_window(self):
+        first = ArticleRevision.objects.get(article=self.urlpath.article)
+        r1 = self.revise(0)
+        # exactly the window apart
+        r2 = self.revise(600)
+        # just outside the window
+        r3 = self.revise(1201)
+        r4 = self.revise(1300, user=self.other)
+        self.assertEqual(self.compact(), 1)
+        self.assertChain([first, r2, r3, r4])
+        self.assertFalse(ArticleRevision.objects.filter(pk=r1.pk).exists())
+
+    def test_before(self):
+        first = ArticleRevision.objects.get(article=self.urlpath.article)
+        r1 = self.revise(0)
+        r2 = self.revise(10)
+        self.assertEqual(self.compact(before=self.start), 0)
+        self.assertChain([first, r1, r2])
+
+    def test_author(self):
+        first = ArticleRevision.objects.get(article=self.urlpath.article)
+        r1 = self.revise(0)
+        r2 = self.revise(10, user=self.other)
+        r3 = self.revise(20)
+        self.assertEqual(self.compact(), 0)
+        self.assertChain([first, r1, r2, r3])
+
+    def test_deleted_and_locked(self):
+        first = ArticleRevision.objects.get(article=self.urlpath.article)
+        r1 = self.revise(0)
+        r2 = self.revise(10, deleted=True)
+        r3 = self.revise(20, deleted=False, locked=True)
+        r4 = self.revise(30, locked=False)
+        self.assertEqual(self.compact(), 0)
+        self.assertChain([first, r1, r2, r3, r4])
+
+    def test_referenced(self):
+        first = ArticleRevision.objects.get(article=self.urlpath.article)
+        r1 = self.revise(0)
+        r2 = self.revise(10)
+        r3 = self.revise(20)
+        # r1 was the latest revision when the action was created
+        Action.objects.create(
+            actor=self.user,
+            verb='edited',
+            action_object=WikiArticle.objects.get(article=self.urlpath.article),
+            timestamp=self.start + datetime.timedelta(seconds=5)
+        )
+        self.assertEqual(self.compact(), 1)
+        self.assertChain([first, r1, r3])
+
+    def test_snapshot(self):
+        first = ArticleRevision.objects.get(article=self.urlpath.article)
+        r1 = self.revise(0)
+        r2 = self.revise(10)
+        r3 = self.revise(20)
+        RevisionDelta.objects.create(
+            revision=r3, base=r1, delta=make_delta(r1.content, r3.content))
+        self.assertEqual(self.compact(), 1)
+        self.assertChain([first, r1, r3])
+        self.assertEqual(RevisionDelta.objects.get().base_id, r1.pk)
+
+    def test_plugin_data(self):
+        r1 = self.revise(0)
+        # deleted plugins stay with their revision
+        plugin = SimplePlugin.objects.create(
+            article=self.urlpath.article, article_revision=r1, deleted=True)
+        r2 = self.revise(10)
+        self.assertEqual(self.compact(), 1)
+        self.assertEqual(
+            SimplePlugin.objects.get(pk=plugin.pk).article_revision_id, r2.pk)
+
+    def test_command(self):
+        first = ArticleRevision.objects.get(article=self.urlpath.article)
+        r1 = self.revise(0)
+        r2 = self.revise(10)
+        out = StringIO()
+        call_command('compact_wiki_revisions', '--dry-run', '--older-than', '0',
+                     stdout=out)
+        self.assertIn('Would drop 1 revisions.', out.getvalue())
+        self.assertChain([first, r1, r2])
+        call_command('compact_wiki_revisions', '--older-than', '0', stdout=StringIO())
+        self.assertChain([first, r2])
+
+    def test_coalesce(self):
+        first = ArticleRevision.objects.get(article=self.urlpath.article)
+        r1 = self.revise(0, user_message='Fix typos')
+        r2 = self.revise(10)
+        self.assertTrue(coalesce_revision(r2, self.window))
+        self.assertChain([first, r2])
+        self.assertEqual(ArticleRevision.objects.get(pk=r2.pk).user_message, 'Fix typos')
+        # outside the window, and the first revision is always kept
+        r3 = self.revise(1000)
+        self.assertFalse(coalesce_revision(r3, self.window))
+        self.assertFalse(coalesce_revision(r2, datetime.timedelta(days=365)))
+        self.assertChain([first, r2, r3])
+
+    def test_coalesce_protected(self):
+        first = ArticleRevision.objects.get(article=self.urlpath.article)
+        r1 = self.revise(0)
+        r2 = self.revise(10)
+        Action.objects.create(
+            actor=self.user,
+            verb='edited',
+            action_object=WikiArticle.objects.get(article=self.urlpath.article),
+            timestamp=self.start + datetime.timedelta(seconds=5)
+        )
+        self.assertFalse(coalesce_revision(r2, self.window))
+        r3 = self.revise(20)
+        r4 = self.revise(30)
+        RevisionDelta.objects.create(
+            revision=r4, base=r3, delta=make_delta(r3.content, r4.content))
+        self.assertFalse(coalesce_revision(r4, self.window))
+        self.assertChain([first, r1, r2, r3, r4])
+
+
+class DiffTests(SpaceWikiTestCase):
+
+    def test_hunks(self):
+        old = ''.join('line %d\n' % i for i in range(100))
+        new = old.replace('line 10\n', 'line ten\n').replace('line 80\n', '')
+        hunks = diff_hunks(old, new)
+        self.assertEqual(len(hunks), 2)
+        first, second = hunks
+        self.assertEqual(
+            (first['old_start'], first['old_lines'], first['new_start'], first['new_lines']),
+            (8, 7, 8, 7))
+        self.assertIn(['-', 'line 10', [[False, 'line '], [True, '10']]], first['lines'])
+        self.assertIn(['+', 'line ten', [[False, 'line '], [True, 'ten']]], first['lines'])
+        self.assertEqual([line for line in second['lines'] if line[0] != ' '],
+            [['-', 'line 80']])
+
+    def test_cached_per_revision_pair(self):
+        urlpath = create_article(self.root, 'diffed', self.wiki, content='a\n')
+        revision = add_revision(urlpath, content='b\n')
+        hunks = get_revision_diff(revision)
+        revision = ArticleRevision.objects.defer('content').get(pk=revision.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_revision_diff(revision), hunks)
+
+    def test_view(self):
+        assign_perm('access_space', self.user, self.space)
+        urlpath = create_article(self.root, 'diffed', self.wiki, content='a\n')
+        revision = add_revision(urlpath, content='b\n')
+        response = views.SpaceDiffView.as_view()(
+            make_request(self.user, self.space),
+            revision_id=revision.pk
+        )
+        self.assertEqual(response.status_code, 200)
+        diff = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(diff['count'], 1)
+        self.assertEqual(len(diff['hunks']), 1)
+
+    def test_view_other_space(self):
+        assign_perm('access_space', self.user, self.space)
+        other_space = Space.objects.create(name='Other space')
+        other_wiki, _ = SpacesWiki.objects.get_or_create(space=other_space)
+        urlpath = create_article(self.root, 'other', other_wiki, content='a\n')
+        revision = add_revision(urlpath, content='b\n')
+        with self.assertRaises(Http404):
+            views.SpaceDiffView.as_view()(
+                make_request(self.user, self.space),
+                revision_id=revision.pk
+            )
+
+
+@skipUnless(BENCHMARKS, 'benchmarks are disabled')
+class DiffBenchmark(SpaceWikiTestCase):
+    revisions = 200
+    # about 1 MB
+    lines = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        super(DiffBenchmark, cls).setUpTestData()
+        lines = ['Line %d of a long notebook, %s\n' % (i, 'text ' * 5)
+                 for i in range(cls.lines)]
+        cls.urlpath = create_article(
+            cls.root, 'large', cls.wiki, content=''.join(lines))
+        for i in range(cls.revisions):
+            for j in range(5):
+                lines[random.randrange(cls.lines)] = 'Edit %d.%d\n' % (i, j)
+            add_revision(cls.urlpath, content=''.join(lines))
+
+    def test_diff_time(self):
+        cache.clear()
+        revisions = ArticleRevision.objects.filter(
+            article=self.urlpath.article,
+            previous_revision__isnull=False
+        ).defer('content')
+        for revision in random.sample(list(revisions), 20):
+            start = time.perf_counter()
+            get_revision_diff(revision)
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            get_revision_diff(revision)
+            cached = time.perf_counter() - start
+            self.assertLess(cold, 1, 'diff took %.3fs' % cold)
+            self.assertLess(cached, 0.005, 'cached diff took %.3fs' % cached)
+
+
+class TransferTests(SpaceWikiTestCase):
+
+    def test_roundtrip(self):
+        parent = create_article(self.root, 'parent', self.wiki, content='Parent')
+        child = create_article(parent, 'child', self.wiki, content='Child')
+        add_revision(child, content='Child, edited')
+        create_article(self.root, 'other', self.wiki)
+        space = Space.objects.create(name='Imported space')
+        with tempfile.NamedTemporaryFile(suffix='.gz') as archive:
+            export_space(self.space, archive, history=True)
+            archive.flush()
+            self.assertEqual(import_space(space, archive.name), 3)
+
+        # top level slugs are shared with the exported space
+        paths = dict(ArticlePath.objects.filter(space=space).values_list(
+            'path', 'urlpath'))
+        self.assertEqual(set(paths), {'parent1/', 'parent1/child/', 'other1/'})
+        child = URLPath.objects.get(pk=paths['parent1/child/'])
+        self.assertEqual(child.parent_id, paths['parent1/'])
+        self.assertEqual(child.article.current_revision.content, 'Child, edited')
+        self.assertEqual(child.article.articlerevision_set.count(), 2)
+        # the nested sets of the shared tree are still consistent
+        self.assertEqual(
+            URLPath.root().get_descendant_count(), URLPath.objects.count() - 1)
+        self.assertEqual(
+            list(URLPath.objects.get(pk=paths['parent1/']).get_descendants()),
+            [child])
+        self.assertTrue(search(space, 'edited').exists())
+
+    def test_caches(self):
+        create_article(self.root, 'page', self.wiki, content='Page')
+        space = Space.objects.create(name='Imported space')
+        SpacesWiki.objects.get_or_create(space=space)
+        self.assertEqual(get_recent_changes(space.pk), [])
+        self.assertEqual(get_toc(space.pk), [])
+        with tempfile.NamedTemporaryFile(suffix='.gz') as archive:
+            export_space(self.space, archive)
+            archive.flush()
+            import_space(space, archive.name)
+        self.assertEqual(
+            [change['path'] for change in get_recent_changes(space.pk)], ['page1/'])
+        self.assertEqual([node['path'] for node in get_toc(space.pk)], ['page1/'])
+
+    def test_no_ip_address(self):
+        urlpath = create_article(self.root, 'page', self.wiki)
+        add_revision(urlpath, ip_address='192.0.2.1')
+        with tempfile.NamedTemporaryFile(suffix='.gz') as archive:
+            export_space(self.space, archive, history=True)
+            archive.flush()
+            with gzip.open(archive.name) as exported:
+                self.assertNotIn(b'192.0.2.1', exported.read())
+
+
+class StartupTests(TestCase):
+
+    def test_ready_without_queries(self):
+        # ready() runs in every worker process on startup
+        with self.assertNumQueries(0):
+            apps.get_app_config('spaces_wiki').ready()
+
+
+class ConditionalTests(SpaceWikiTestCase):
+
+    def setUp(self):
+        cache.clear()
+        assign_perm('access_space', self.user, self.space)
+        self.urlpath = create_article(self.root, 'cached', self.wiki, content='x')
+        self.rendered = 0
+
+        @article_condition
+        def view(request, path=None, article_id=None):
+            self.rendered += 1
+            return HttpResponse('rendered')
+        self.view = view
+
+    def get(self, **headers):
+        request = RequestFactory().get('/notes/cached/', **headers)
+        request.SPACE = self.space
+        request.user = self.user
+        return self.view(request, path='cached/')
+
+    def test_revalidation(self):
+        etag = self.get()['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.rendered, 1)
+        # the article state, at most the user's permissions besides
+        self.assertLessEqual(len(queries), 3)
+        for query in queries:
+            self.assertNotIn('"wiki_articlerevision"."content"', query['sql'])
+
+    def test_changes_invalidate(self):
+        etag = self.get()['ETag']
+        add_revision(self.urlpath, content='y')
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.get()['ETag']
+        create_article(self.urlpath, 'child', self.wiki)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_revoked_access(self):
+        etag = self.get()['ETag']
+        remove_perm('access_space', self.user, self.space)
+        # no 304 for the cached page, the view denies access
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.rendered, 2)
+
+
+class OutboxTests(SpaceWikiTestCase):
+
+    def setUp(self):
+        self.events = []
+        for slug in ('failing', 'working'):
+            urlpath = create_article(self.root, slug, self.wiki)
+            self.events.append(WikiEvent.objects.create(
+                verb=WikiEvent.CREATED,
+                wikiarticle=WikiArticle.objects.get(article=urlpath.article),
+                space=self.space,
+                user=self.user
+            ))
+        WikiEvent.objects.update(
+            updated=timezone.now() - datetime.timedelta(days=1))
+
+    def test_failing_send(self):
+        failing, working = self.events
+
+        def send_event(event):
+            if event.pk == failing.pk:
+                raise RuntimeError('mail server down')
+        with mock.patch('spaces_wiki.outbox.send_event', side_effect=send_event):
+            self.assertEqual(process_events(), 1)
+            # the failed event waits for its retry
+            self.assertEqual(process_events(), 0)
+        failing.refresh_from_db()
+        self.assertIsNone(failing.processed)
+        self.assertEqual(failing.attempts, 1)
+        self.assertIn('mail server down', failing.last_error)
+        self.assertGreater(failing.retry_at, timezone.now())
+        working.refresh_from_db()
+        self.assertIsNotNone(working.processed)
+
+    def test_worker_died(self):
+        failing, working = self.events
+        # claimed by a worker that died before sending
+        self.assertTrue(claim_event(failing))
+        with mock.patch('spaces_wiki.outbox.send_event') as send_event:
+            self.assertEqual(process_events(), 1)
+            WikiEvent.objects.filter(pk=failing.pk).update(
+                claimed_until=timezone.now() - datetime.timedelta(seconds=1))
+            self.assertEqual(process_events(), 1)
+        self.assertEqual(send_event.call_count, 2)
+        failing.refresh_from_db()
+        self.assertIsNotNone(failing.processed)
+        self.assertIsNone(failing.claimed_until)
+        self.assertEqual(failing.attempts, 2)
+
+    def test_send(self):
+        # the real actions and notifications, outside of a request
+        self.assertEqual(process_events(), 2)
+        self.assertFalse(WikiEvent.objects.filter(processed__isnull=True).exists())
+        self.assertEqual(Action.objects.filter(
+            target_object_id=str(self.space.pk)).count(), 2)
+
+    def test_delete_old_events(self):
+        failing, working = self.events
+        old = timezone.now() - datetime.timedelta(days=31)
+        WikiEvent.objects.filter(pk=working.pk).update(processed=old)
+        WikiEvent.objects.filter(pk=failing.pk).update(attempts=5, updated=old)
+        pending = WikiEvent.objects.create(
+            verb=WikiEvent.MODIFIED,
+            wikiarticle=failing.wikiarticle,
+            space=self.space,
+            user=self.user
+        )
+        self.assertEqual(delete_old_events(days=30), 2)
+        self.assertEqual(list(WikiEvent.objects.all()), [pending])
+
+
+class ViewBudgetTestCase(SpaceWikiTestCase):
+    """
+        Requests Space* views directly and measures query count, wall time
+        and peak memory, failing if they exceed a budget.
+        Requests are made by a regular member, who may access the space
+        through the object permission of a group, with a fresh user object
+        per request like in production. Only SpaceDelete, which requires a
+        space administrator, is requested by a superuser.
+        The measurements are appended as JSON lines to the file given by
+        SPACES_WIKI_BUDGET_REPORT after each test class.
+    """
+    # queries per request, by view and method
+    query_budgets = {
+        ('SpaceArticleView', 'get'): 12,
+        ('SpaceIndex', 'get'): 10,
+        ('SpaceDir', 'get'): 12,
+        ('SpaceCreate', 'get'): 12,
+        ('SpaceCreate', 'post'): 40,
+        ('SpaceEdit', 'get'): 12,
+        ('SpaceEdit', 'post'): 35,
+        ('SpaceHistory', 'get'): 12,
+        ('SpaceDelete', 'get'): 14,
+        ('SpaceDelete', 'post'): 30,
+        ('SpaceDeleted', 'get'): 12,
+    }
+    max_seconds = 1
+    max_memory = 50 * 1024 * 1024
+
+    @classmethod
+    def setUpClass(cls):
+        super(ViewBudgetTestCase, cls).setUpClass()
+        cls.measurements = []
+
+    @classmethod
+    def tearDownClass(cls):
+        report = os.environ.get('SPACES_WIKI_BUDGET_REPORT')
+        if report and cls.measurements:
+            with open(report, 'a') as f:
+                for measurement in cls.measurements:
+                    f.write(json.dumps(measurement) + '\n')
+        super(ViewBudgetTestCase, cls).tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        super(ViewBudgetTestCase, cls).setUpTestData()
+        cls.admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'secret')
+        members = Group.objects.create(name='Test space members')
+        assign_perm('access_space', members, cls.space)
+        cls.user.groups.add(members)
+
+    def setUp(self):
+        # permissions are evaluated from the database at least once
+        cache.clear()
+
+    def fresh_user(self, user=None):
+        """
+            Returns a new object for user (default: the member), as in the
+            next request.
+        """
+        return get_user_model().objects.get(pk=(user or self.user).pk)
+
+    def request(self, view_class, method='get', data=None, user=None, **kwargs):
+        """
+            Returns the response of view_class and the number of queries,
+            seconds and peak bytes of memory used for it.
+        """
+        request = make_request(self.fresh_user(user), self.space, method, data)
+        tracemalloc.start()
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            try:
+                response = view_class.as_view()(request, **kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+            except PermissionDenied:
+                response = HttpResponseForbidden()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return response, len(queries), elapsed, peak
+
+    def assertWithinBudget(self, view_class, method='get', data=None,
+                           user=None, warm=True, **kwargs):
+        """
+            Requests view_class, after one warm-up request unless warm is
+            False, records the measurements and returns the response and
+            query count.
+        """
+        if warm:
+            self.request(view_class, user=user, **kwargs)
+        response, count, elapsed, peak = self.request(
+            view_class, method=method, data=data, user=user, **kwargs)
+        name = view_class.__name__
+        self.measurements.append({
+            'test': self.id(),
+            'view': name,
+            'method': method,
+            'path': kwargs.get('path'),
+            'queries': count,
+            'seconds': elapsed,
+            'memory': peak,
+        })
+        self.assertLess(response.status_code, 400, '%s: status %d' % (
+            name, response.status_code))
+        self.assertLessEqual(count, self.query_budgets[(name, method)],
+            '%s %s: %d queries' % (name, method, count))
+        self.assertLess(elapsed, self.max_seconds, '%s: %.3fs' % (name, elapsed))
+        self.assertLess(peak, self.max_memory, '%s: %d bytes' % (name, peak))
+        return response, count
+
+
+class ViewBudgetTests(ViewBudgetTestCase):
+    """
+        Every view has to stay within its budget, and the number of
+        queries must not depend on the size of the space or the length of
+        an article's history.
+    """
+    sizes = (1, 100)
+    depth = 30
+    revisions = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        super(ViewBudgetTests, cls).setUpTestData()
+        for size in cls.sizes:
+            parent = create_article(cls.root, 'wide-%d' % size, cls.wiki)
+            for i in range(size):
+                create_article(parent, 'child-%d' % i, cls.wiki)
+        parent = cls.root
+        for i in range(cls.depth):
+            parent = create_article(parent, 'deep-%d' % i, cls.wiki)
+        cls.deep = parent
+        cls.edited = create_article(cls.root, 'edited', cls.wiki, content='')
+        for i in range(cls.revisions):
+            add_revision(cls.edited, content='Revision %d' % i)
+        cls.deleted = create_article(cls.root, 'deleted', cls.wiki)
+        add_revision(cls.deleted, deleted=True)
+
+    def assertConstant(self, view_class, paths, **kwargs):
+        counts = [
+            self.assertWithinBudget(view_class, path=path, **kwargs)[1]
+            for path in paths
+        ]
+        self.assertEqual(len(set(counts)), 1, '%s: %s queries for %s' % (
+            view_class.__name__, counts, paths))
+
+    def wide_paths(self):
+        return ['wide-%d/' % size for size in self.sizes]
+
+    def test_article(self):
+        self.assertConstant(views.SpaceArticleView, self.wide_paths())
+
+    def test_depth(self):
+        shallow = self.request(views.SpaceArticleView, path='deep-0/')[1]
+        deep = self.request(views.SpaceArticleView, path=self.deep.path)[1]
+        # only wiki's get_article walks the path, one query per level, in
+        # our decorator and again in wiki's ArticleView.dispatch
+        self.assertLessEqual(deep - shallow, 2 * (self.depth - 1))
+
+    def test_index(self):
+        self.assertWithinBudget(views.SpaceIndex, path='')
+
+    def test_dir(self):
+        self.assertConstant(views.SpaceDir, self.wide_paths())
+
+    def test_create(self):
+        self.assertConstant(views.SpaceCreate, self.wide_paths())
+        for path in self.wide_paths():
+            response, count = self.assertWithinBudget(
+                views.SpaceCreate,
+                method='post',
+                data={'title': 'New article', 'content': 'Text', 'summary': ''},
+                path=path
+            )
+            self.assertEqual(response.status_code, 302)
+
+    def test_edit(self):
+        self.assertConstant(views.SpaceEdit, ['wide-1/', self.edited.path])
+        urlpath = URLPath.objects.get(pk=self.edited.pk)
+        response, count = self.assertWithinBudget(
+            views.SpaceEdit,
+            method='post',
+            data={
+                'title': 'Edited',
+                'content': 'Edited text',
+                'summary': '',
+                'current': urlpath.article.current_revision_id,
+            },
+            path=self.edited.path
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_history(self):
+        self.assertConstant(views.SpaceHistory, ['wide-1/', self.edited.path])
+
+    def test_delete(self):
+        self.assertWithinBudget(views.SpaceDelete, user=self.admin, path='wide-1/')
+        urlpath = URLPath.objects.get(slug='wide-1')
+        response, count = self.assertWithinBudget(
+            views.SpaceDelete,
+            method='post',
+            data={'revision': urlpath.article.current_revision_id},
+            user=self.admin,
+            path='wide-1/'
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_deleted(self):
+        self.assertWithinBudget(views.SpaceDeleted, path=self.deleted.path)
+
+
+@skipUnless(BENCHMARKS, 'benchmarks are disabled')
+class LargeViewBudgetTests(ViewBudgetTests):
+    sizes = (1, 100, 10000)
+    depth = 200
+    revisions = 2000
+
+
+class MergeTests(ViewBudgetTestCase):
+
+    def create_encoded(self, slug, wiki):
+        """
+            Returns an article of wiki and one of its delta-encoded
+            revisions.
+        """
+        urlpath = create_article(self.root, slug, wiki, content='')
+        content = ''
+        for i in range(5):
+            content = edit_content(content, i)
+            add_revision(urlpath, content=content)
+        compress_article(Article.objects.get(pk=urlpath.article_id), 3)
+        return urlpath, RevisionDelta.objects.filter(
+            revision__article=urlpath.article_id).first().revision
+
+    def test_preview(self):
+        urlpath, revision = self.create_encoded('merged', self.wiki)
+        response = views.merge(
+            make_request(self.admin, self.space),
+            revision_id=revision.pk,
+            article_id=urlpath.article_id,
+            preview=True
+        )
+        self.assertEqual(response.status_code, 200)
+        # previews don't write
+        self.assertTrue(RevisionDelta.objects.filter(revision=revision).exists())
+
+    def test_other_space(self):
+        other_space = Space.objects.create(name='Other space')
+        other_wiki, _ = SpacesWiki.objects.get_or_create(space=other_space)
+        urlpath, revision = self.create_encoded('other', other_wiki)
+        with self.assertRaises(Http404):
+            views.merge(
+                make_request(self.admin, self.space),
+                revision_id=revision.pk,
+                article_id=urlpath.article_id
+            )
+        self.assertTrue(RevisionDelta.objects.filter(revision=revision).exists())
+
+
+class ChildrenTests(ViewBudgetTestCase):
+
+    def test_post_without_children(self):
+        parent = create_article(self.root, 'parent', self.wiki)
+        for i in range(3):
+            create_article(parent, 'child-%d' % i, self.wiki)
+        data = {'title': 'Preview', 'content': 'Text'}
+        self.request(views.SpacePreview, 'post', data, path=parent.path)
+        with mock.patch.object(wiki_settings, 'SHOW_MAX_CHILDREN', 0):
+            count = self.request(
+                views.SpacePreview, 'post', data, path=parent.path)[1]
+        # wiki's ArticleMixin doesn't query the children anymore, ours are
+        # cached
+        with self.assertNumQueries(count):
+            response = views.SpacePreview.as_view()(
+                make_request(self.fresh_user(), self.space, 'post', data),
+                path=parent.path
+            )
+            response.render()
+        self.assertEqual(response.status_code, 200)
+
+
+class FragmentCacheTests(ViewBudgetTestCase):
+
+    def test_article_menu_write_access(self):
+        # two members of the same role, only one may edit the article
+        writers = Group.objects.create(name='Writers')
+        writer = get_user_model().objects.create_user(
+            'writer', 'writer@example.com', 'secret')
+        writer.groups.add(writers, *self.user.groups.all())
+        urlpath = create_article(self.root, 'restricted', self.wiki)
+        article = urlpath.article
+        article.group = writers
+        article.group_write = True
+        article.other_write = False
+        article.save()
+        response = self.request(views.SpaceArticleView, user=writer,
+                                path=urlpath.path)[0]
+        self.assertIn('btn-edit', response.content.decode())
+        response = self.request(views.SpaceArticleView, path=urlpath.path)[0]
+        self.assertNotIn('btn-edit', response.content.decode())
+        # and the other way round
+        cache.clear()
+        self.request(views.SpaceArticleView, path=urlpath.path)
+        response = self.request(views.SpaceArticleView, user=writer,
+                                path=urlpath.path)[0]
+        self.assertIn('btn-edit', response.content.decode())
+
+
+class InstrumentationTests(ViewBudgetTestCase):
+
+    def setUp(self):
+        instrumentation.INSTRUMENTATION = True
+        self.addCleanup(setattr, instrumentation, 'INSTRUMENTATION', False)
+        cache.clear()
+
+    def test_server_timing(self):
+        urlpath = create_article(self.root, 'timed', self.wiki)
+        response = self.request(views.SpaceArticleView, path=urlpath.path)[0]
+        names = [
+            metric.split(';')[0]
+            for metric in response['Server-Timing'].split(', ')
+        ]
+        for name in ('view', 'get_article', 'permission', 'template', 'total'):
+            self.assertIn(name, names)
+        self.assertEqual(names[-1], 'total')
+
+    def test_percentiles(self):
+        urlpath = create_article(self.root, 'timed', self.wiki)
+        for i in range(3):
+            self.request(views.SpaceArticleView, path=urlpath.path)
+        self.assertEqual(instrumentation.get_recorded_spaces(), [self.space.pk])
+        metrics = instrumentation.get_percentiles(self.space.pk)['article']
+        self.assertEqual(metrics['total']['count'], 3)
+        self.assertLessEqual(metrics['total']['p50'], metrics['total']['p99'])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(instrumentation.percentile(values, 50), 50)
+        self.assertEqual(instrumentation.percentile(values, 99), 99)
+        self.assertEqual(instrumentation.percentile([7], 90), 7)
+
+    def test_disabled(self):
+        instrumentation.INSTRUMENTATION = False
+        urlpath = create_article(self.root, 'timed', self.wiki)
+        response = self.request(views.SpaceArticleView, path=urlpath.path)[0]
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class RacingCreate(views.SpaceCreate):
+    """
+        Lets another article take the cleaned slug right before the new
+        article is saved.
+    """
+
+    def form_valid(self, form):
+        URLPath.create_urlpath(self.urlpath, form.cleaned_data['slug'])
+        return super(RacingCreate, self).form_valid(form)
+
+
+class CreateSlugTests(ViewBudgetTestCase):
+
+    def test_same_title(self):
+        create_article(self.root, 'meeting-notes', self.wiki)
+        for i in range(1, 21):
+            create_article(self.root, 'meeting-notes%d' % i, self.wiki)
+        request = make_request(self.admin, self.space, 'post', {
+            'title': 'Meeting notes', 'content': '', 'summary': ''})
+        with CaptureQueriesContext(connection) as queries:
+            response = views.SpaceCreate.as_view()(request, path='')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(URLPath.objects.filter(slug='meeting-notes21').exists())
+        slug_queries = [q for q in queries if 'LIKE' in q['sql'].upper()]
+        self.assertEqual(len(slug_queries), 1)
+
+    def test_conflict_retry(self):
+        request = make_request(self.admin, self.space, 'post', {
+            'title': 'Meeting notes', 'content': '', 'summary': ''})
+        response = RacingCreate.as_view()(request, path='')
+        self.assertEqual(response.status_code, 302)
+        slugs = set(URLPath.objects.filter(
+            parent=self.root).values_list('slug', flat=True))
+        self.assertEqual(slugs, {'meeting-notes', 'meeting-notes1'})
+        self.assertTrue(WikiArticle.objects.filter(
+            article__urlpath__slug='meeting-notes1').exists())
+
+    def test_conflict_every_attempt(self):
+        request = make_request(self.admin, self.space, 'post', {
+            'title': 'Meeting notes', 'content': '', 'summary': ''})
+        count = URLPath.objects.count()
+        with mock.patch.object(URLPath, '_create_urlpath_from_request',
+                               side_effect=IntegrityError) as create:
+            response = views.SpaceCreate.as_view()(request, path='')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(create.call_count, views.SLUG_ATTEMPTS)
+        self.assertEqual(URLPath.objects.count(), count)
+        self.assertFalse(WikiArticle.objects.filter(wiki=self.wiki).exists())
+
+    def test_title_without_slug(self):
+        create_article(self.root, 'other', self.wiki)
+        self.assertEqual(unique_slug(self.root, ''), 'article')
+        create_article(self.root, 'article', self.wiki)
+        self.assertEqual(unique_slug(self.root, slugify('?!')), 'article1')
+
+
+@skipIf(connection.vendor == 'sqlite', 'sqlite serializes all writes')
+class ParallelCreateTests(TransactionTestCase):
+    """
+        Articles with the same title created concurrently all end up with
+        distinct slugs.
+    """
+    threads = 8
+    articles_per_thread = 5
+
+    def setUp(self):
+        self.root = URLPath.create_root()
+        self.space = Space.objects.create(name='Test space')
+        self.wiki, _ = SpacesWiki.objects.get_or_create(space=self.space)
+        self.admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'secret')
+
+    def create_articles(self, statuses):
+        try:
+            for i in range(self.articles_per_thread):
+                request = make_request(self.admin, self.space, 'post', {
+                    'title': 'Meeting notes', 'content': '', 'summary': ''})
+                response = views.SpaceCreate.as_view()(request, path='')
+                statuses.append(response.status_code)
+        finally:
+            connections.close_all()
+
+    def test_parallel_create(self):
+        statuses = []
+        threads = [
+            threading.Thread(target=self.create_articles, args=(statuses,))
+            for i in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total = self.threads * self.articles_per_thread
+        self.assertEqual(statuses, [302] * total)
+        slugs = URLPath.objects.filter(
+            parent=self.root).values_list('slug', flat=True)
+        self.assertEqual(len(set(slugs)), total)
+        self.assertEqual(WikiArticle.objects.filter(wiki=self.wiki).count(), total)
+
+
+class WikiArticleSummaryTests(SpaceWikiTestCase):
+    """
+        WikiArticle's copies of the article data follow every change.
+    """
+
+    def test_created(self):
+        parent = create_article(self.root, 'parent', self.wiki, title='Parent')
+        child = create_article(parent, 'child', self.wiki, title='Child')
+        wikiarticle = WikiArticle.objects.get(article=child.article)
+        self.assertEqual(wikiarticle.space_id, self.space.pk)
+        self.assertEqual(wikiarticle.title, 'Child')
+        self.assertEqual(wikiarticle.path, 'parent/child/')
+        self.assertFalse(wikiarticle.deleted)
+        self.assertIsNotNone(wikiarticle.modified)
+        self.assertEqual(str(wikiarticle), 'Child')
+
+    def test_revision(self):
+        urlpath = create_article(self.root, 'article', self.wiki, title='Old')
+        add_revision(urlpath, title='New', deleted=True)
+        wikiarticle = WikiArticle.objects.get(article=urlpath.article)
+        self.assertEqual(wikiarticle.title, 'New')
+        self.assertTrue(wikiarticle.deleted)
+
+    def test_listing(self):
+        parent = create_article(self.root, 'parent', self.wiki)
+        create_article(parent, 'b', self.wiki, title='B')
+        create_article(parent, 'a', self.wiki, title='A')
+        deleted = create_article(parent, 'c', self.wiki, title='C')
+        add_revision(deleted, deleted=True)
+        children = space_directory(parent, self.space)
+        self.assertEqual(
+            [child.article.current_revision.title for child in children],
+            ['A', 'B']
+        )
+
+
+class PermissionTests(SpaceWikiTestCase):
+    """
+        Space permissions are evaluated once and cached until memberships
+        or permissions change.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh_user(self):
+        # a new user object, as in the next request
+        return get_user_model().objects.get(pk=self.user.pk)
+
+    def test_memoized(self):
+        user = self.fresh_user()
+        get_space_permissions(user, self.space)
+        with self.assertNumQueries(0):
+            get_space_permissions(user, self.space)
+        with self.assertNumQueries(0):
+            get_space_permissions(self.fresh_user(), self.space)
+
+    def test_object_permission(self):
+        self.assertFalse(get_space_permissions(self.fresh_user(), self.space).access)
+        assign_perm('access_space', self.user, self.space)
+        self.assertTrue(get_space_permissions(self.fresh_user(), self.space).access)
+        remove_perm('access_space', self.user, self.space)
+        self.assertFalse(get_space_permissions(self.fresh_user(), self.space).access)
+
+    def test_group_membership(self):
+        group = Group.objects.create(name='members')
+        assign_perm('access_space', group, self.space)
+        self.assertFalse(get_space_permissions(self.fresh_user(), self.space).access)
+        self.user.groups.add(group)
+        self.assertTrue(get_space_permissions(self.fresh_user(), self.space).access)
+        group.delete()
+        self.assertFalse(get_space_permissions(self.fresh_user(), self.space).access)
+
+    def test_permission_group(self):
+        # e.g. keys of cached children and ETags
+        token = get_permission_group(self.fresh_user(), self.space.pk)
+        self.assertEqual(get_permission_group(self.fresh_user(), self.space.pk), token)
+        self.user.groups.add(Group.objects.create(name='readers'))
+        self.assertNotEqual(
+            get_permission_group(self.fresh_user(), self.space.pk), token)
+
+    def test_owner_or_admin(self):
+        permissions = get_space_permissions(self.user, self.space)
+        self.assertTrue(permissions.is_owner_or_admin(self.user, self.user.pk))
+        self.assertFalse(permissions.is_owner_or_admin(self.user, None))
+
+
+class RecentChangesTests(SpaceWikiTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.first = create_article(self.root, 'first', self.wiki, title='First')
+        self.second = create_article(self.root, 'second', self.wiki, title='Second')
+        # changes are recorded on commit, which never happens in TestCase
+        cache.clear()
+
+    def titles(self):
+        return [change['title'] for change in get_recent_changes(self.space.pk)]
+
+    def test_order(self):
+        self.assertEqual(self.titles(), ['Second', 'First'])
+        with self.assertNumQueries(0):
+            self.titles()
+
+    def test_update(self):
+        self.titles()
+        add_revision(self.first, title='First, edited')
+        update_recent_changes(self.space.pk, self.first.article)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles(), ['First, edited', 'Second'])
+
+    def test_deleted(self):
+        self.titles()
+        add_revision(self.second, deleted=True)
+        update_recent_changes(self.space.pk, self.second.article)
+        self.assertEqual(self.titles(), ['First'])
+        cache.clear()
+        self.assertEqual(self.titles(), ['First'])
+
+    def test_count(self):
+        changes = get_recent_changes(self.space.pk, 1)
+        self.assertEqual([change['path'] for change in changes], ['second/'])
+
+
+class TrashTests(ViewBudgetTestCase):
+
+    def setUp(self):
+        self.deleted = []
+        for i in range(5):
+            urlpath = create_article(self.root, 'deleted-%d' % i, self.wiki)
+            add_revision(urlpath, deleted=True)
+            self.deleted.append(urlpath)
+        self.child = create_article(self.deleted[0], 'child', self.wiki)
+        self.kept = create_article(self.root, 'kept', self.wiki)
+
+    def test_keyset_pages(self):
+        pages = []
+        cursor = None
+        while True:
+            with self.assertNumQueries(1):
+                page, cursor = get_trash(self.space, before=cursor, limit=2)
+            pages.append([wikiarticle.article_id for wikiarticle in page])
+            if cursor is None:
+                break
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        ids = sum(pages, [])
+        self.assertEqual(
+            sorted(ids),
+            sorted(urlpath.article_id for urlpath in self.deleted)
+        )
+
+    def test_restore(self):
+        request = make_request(self.admin, self.space, 'post')
+        ids = [urlpath.article_id for urlpath in self.deleted[:3]]
+        self.assertEqual(restore_articles(request, ids, batch_size=2), 3)
+        page, cursor = get_trash(self.space)
+        self.assertEqual(len(page), 2)
+
+    def test_purge(self):
+        target = self.deleted[0]
+        purged, skipped = purge_trash(self.space, article_ids=[target.article_id])
+        self.assertEqual((purged, skipped), (1, []))
+        self.assertFalse(Article.objects.filter(
+            pk__in=[target.article_id, self.child.article_id]).exists())
+        self.assertTrue(Article.objects.filter(pk=self.kept.article_id).exists())
+        self.assertEqual(len(get_trash(self.space)[0]), 4)
+
+    def test_scheduled_purge(self):
+        target, restored = self.deleted[:2]
+        self.assertEqual(schedule_purge(self.space, [
+            target.article_id, restored.article_id, self.kept.article_id]), 2)
+        # nothing is removed before the worker runs
+        self.assertTrue(Article.objects.filter(pk=target.article_id).exists())
+        request = make_request(self.admin, self.space, 'post')
+        restore_articles(request, [restored.article_id])
+        self.assertEqual(purge_pending(), 1)
+        self.assertFalse(Article.objects.filter(
+            pk__in=[target.article_id, self.child.article_id]).exists())
+        self.assertTrue(Article.objects.filter(pk=restored.article_id).exists())
+        self.assertEqual(purge_pending(), 0)
+
+    def test_purge_deltas(self):
+        target = self.deleted[1]
+        for i in range(3):
+            add_revision(target, content='Version %d' % i, deleted=True)
+        compress_article(target.article, 2)
+        self.assertEqual(purge_trash(self.space, article_ids=[target.article_id]), (1, []))
+        self.assertFalse(RevisionDelta.objects.exists())
+
+    def test_purge_other_space_below(self):
+        target = self.deleted[0]
+        other = Space.objects.create(name='Other space')
+        other_wiki, _ = SpacesWiki.objects.get_or_create(space=other)
+        foreign = create_article(target, 'foreign', other_wiki)
+        self.assertEqual(
+            purge_trash(self.space, article_ids=[target.article_id]),
+            (0, [target.article_id])
+        )
+        self.assertEqual(Article.objects.filter(
+            pk__in=[target.article_id, foreign.article_id]).count(), 2)
+
+    def test_toc(self):
+        titles = [node['path'] for node in build_toc(self.space.pk)]
+        self.assertEqual(titles, ['kept/'])
+
+
+class OrphanTests(SpaceWikiTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.live = create_article(self.root, 'live', self.wiki)
+        other = Space.objects.create(name='Other space')
+        other_wiki, _ = SpacesWiki.objects.get_or_create(space=other)
+        self.orphan = create_article(self.root, 'orphan', other_wiki, content='x' * 10)
+        create_article(self.orphan, 'child', other_wiki, content='y' * 5)
+        other_wiki.delete()
+
+    def test_dry_run(self):
+        orphans, last = clean_orphans(dry_run=True)
+        self.assertIsNone(last)
+        self.assertEqual([orphan.urlpath.pk for orphan in orphans], [self.orphan.pk])
+        self.assertEqual(orphans[0].urlpaths, 2)
+        self.assertEqual(orphans[0].revisions, 2)
+        self.assertEqual(orphans[0].size, 15 + len('orphan') + len('child'))
+        self.assertTrue(URLPath.objects.filter(pk=self.orphan.pk).exists())
+
+    def test_size(self):
+        revision = add_revision(self.orphan, content='\xe4' * 4)
+        RevisionDelta.objects.create(
+            revision=revision, base=revision.previous_revision, delta='abc')
+        orphans, last = clean_orphans(dry_run=True)
+        self.assertEqual(orphans[0].revisions, 3)
+        # titles, contents (two bytes per umlaut) and the delta
+        self.assertEqual(
+            orphans[0].size,
+            15 + 2 * len('orphan') + len('child') + 8 + 3
+        )
+
+    def test_command(self):
+        out = StringIO()
+        call_command('clean_wiki_orphans', '--dry-run', stdout=out)
+        self.assertIn('Found 1 orphaned subtrees: 2 paths, 2 revisions', out.getvalue())
+        self.assertTrue(URLPath.objects.filter(pk=self.orphan.pk).exists())
+
+    def test_clean(self):
+        clean_orphans()
+        self.assertFalse(URLPath.objects.filter(slug__in=['orphan', 'child']).exists())
+        self.assertTrue(URLPath.objects.filter(pk=self.live.pk).exists())
+        self.assertTrue(URLPath.objects.filter(pk=self.root.pk).exists())
+
+    def test_kept(self):
+        redirect = URLPath.create_urlpath(self.root, 'redirect')
+        redirect.moved_to = self.live
+        redirect.save()
+        URLPath.create_urlpath(self.root, wiki_settings.LOST_AND_FOUND_SLUG)
+        orphans, last = clean_orphans(dry_run=True)
+        self.assertEqual([orphan.urlpath.pk for orphan in orphans], [self.orphan.pk])
+
+    def test_batches(self):
+        for i in range(3):
+            URLPath.create_urlpath(self.root, 'old-%d' % i)
+        after, found = 0, 0
+        while after is not None:
+            orphans, after = clean_orphans(after=after, limit=2, dry_run=True)
+            found += len(orphans)
+        self.assertEqual(found, 4)
+
+    def test_pending(self):
+        # only the deleted wiki's topmost article was queued
+        self.assertEqual(list(PendingPurge.objects.values_list(
+            'article_id', flat=True)), [self.orphan.article_id])
+        unrelated = URLPath.create_urlpath(self.root, 'unrelated')
+        self.assertEqual(purge_pending(), 1)
+        self.assertFalse(URLPath.objects.filter(slug__in=['orphan', 'child']).exists())
+        self.assertTrue(URLPath.objects.filter(pk=unrelated.pk).exists())
+        self.assertTrue(URLPath.objects.filter(pk=self.live.pk).exists())
+
+    def test_pending_moved_below(self):
+        # an article of a live space was moved below the queued one
+        URLPath.objects.get(pk=self.live.pk).move_to(self.orphan, 'last-child')
+        self.assertEqual(purge_pending(), 0)
+        self.assertTrue(URLPath.objects.filter(pk=self.orphan.pk).exists())
+        self.assertFalse(PendingPurge.objects.exists())
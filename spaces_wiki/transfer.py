@@ -0,0 +1,401 @@
+"""
+    Bulk export and import of a space's wiki.
+
+    An archive is a gzip compressed file of JSON lines: a header line,
+    followed by one line per article in tree order. Each article line holds
+    the article's slug, its level below the space's top level (1), owner,
+    permissions, dates and a list of revisions: only the current one, or
+    all of them for archives exported with history. The IP addresses of
+    revisions are left out.
+
+    Imports bypass the views and model save() methods: rows are created
+    with batched inserts and the tree fields of the URLPaths are computed
+    up front, so no activity stream actions, notifications or per-article
+    signal handlers are triggered. The path and search indexes of the new
+    articles are written along with them.
+"""
+import gzip
+import json
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, transaction
+from django.db.models import Case, DateTimeField, F, IntegerField, Max, Value, When
+from django.utils.dateparse import parse_datetime
+from wiki.models import Article, ArticleForObject, ArticleRevision, URLPath
+
+from .cache import bump_tree_version
+from .deltas import load_content
+from .forms import free_slug
+from .models import ArticlePath, SearchTerm, SpacesWiki, WikiArticle
+from .recent import clear_recent_changes
+from .search import get_postings
+
+FORMAT_VERSION = 1
+ARTICLE_FIELDS = ('group_read', 'group_write', 'other_read', 'other_write')
+REVISION_FIELDS = (
+    'revision_number',
+    'title',
+    'content',
+    'user_message',
+    'automatic_log',
+    'deleted',
+    'locked',
+)
+
+
+def write_line(archive, data):
+    archive.write(json.dumps(data).encode('utf-8'))
+    archive.write(b'\n')
+
+def read_lines(filename):
+    with gzip.open(filename, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            yield json.loads(line)
+
+def get_username(user):
+    return user.get_username() if user is not None else None
+
+
+def export_revision(revision):
+    data = {field: getattr(revision, field) for field in REVISION_FIELDS}
+    data['user'] = get_username(revision.user)
+    data['created'] = revision.created.isoformat()
+    data['modified'] = revision.modified.isoformat()
+    return data
+
+def export_chunk(archive, chunk, history):
+    """
+        Writes a list of (level, urlpath) tuples to archive.
+    """
+    if history:
+        revisions = list(ArticleRevision.objects.filter(
+            article__in=[urlpath.article_id for level, urlpath in chunk]
+        ).select_related('user').order_by('article', 'revision_number'))
+        load_content(revisions)
+        article_revisions = {}
+        for revision in revisions:
+            article_revisions.setdefault(revision.article_id, []).append(revision)
+    for level, urlpath in chunk:
+        article = urlpath.article
+        current = article.current_revision
+        data = {field: getattr(article, field) for field in ARTICLE_FIELDS}
+        data.update({
+            'slug': urlpath.slug,
+            'level': level,
+            'owner': get_username(article.owner),
+            'created': article.created.isoformat(),
+            'modified': article.modified.isoformat(),
+            'current': current.revision_number,
+            'revisions': [
+                export_revision(revision) for revision in
+                (article_revisions[article.pk] if history else [current])
+            ],
+        })
+        write_line(archive, data)
+
+def export_space(space, fileobj, history=False, chunk_size=500):
+    """
+        Writes the articles of space to fileobj as a compressed archive,
+        with all revisions if history is set, otherwise only the current
+        ones. Returns the number of articles exported.
+    """
+    urlpaths = URLPath.objects.filter(
+        article__wikiarticle__wiki__space=space,
+        level__gt=0
+    ).select_related(
+        'article__owner',
+        'article__current_revision__user'
+    ).order_by('tree_id', 'lft')
+    count = 0
+    # right values of the exported ancestors of the current article. Paths
+    # not belonging to the space (e.g. redirects) are skipped, so levels
+    # are recomputed from the exported articles only.
+    ancestors = []
+    chunk = []
+    with gzip.GzipFile(fileobj=fileobj, mode='wb') as archive:
+        write_line(archive, {
+            'version': FORMAT_VERSION,
+            'space': space.name,
+            'history': history,
+        })
+        for urlpath in urlpaths.iterator():
+            while ancestors and ancestors[-1] < urlpath.lft:
+                ancestors.pop()
+            chunk.append((len(ancestors) + 1, urlpath))
+            ancestors.append(urlpath.rght)
+            if len(chunk) == chunk_size:
+                export_chunk(archive, chunk, history)
+                count += len(chunk)
+                chunk = []
+        export_chunk(archive, chunk, history)
+        count += len(chunk)
+    return count
+
+
+def bulk_create(model, objects):
+    """
+        bulk_create() that sets the primary keys of objects on all
+        backends. Where the database doesn't return them, the objects get
+        explicit keys following the highest one, so a concurrent insert
+        makes the import fail instead of mixing up rows.
+    """
+    if not objects:
+        return
+    if not connections[model.objects.db].features.can_return_ids_from_bulk_insert:
+        last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        for pk, obj in enumerate(objects, last_pk + 1):
+            obj.pk = pk
+    model.objects.bulk_create(objects)
+
+def update_dates(model, values, batch_size=500):
+    """
+        Sets the auto_now(_add) fields 'created' and 'modified' of model
+        rows, given as dict of pk to (created, modified), one query per
+        batch_size rows.
+    """
+    pks = list(values)
+    for start in range(0, len(pks), batch_size):
+        batch = pks[start:start + batch_size]
+        model.objects.filter(pk__in=batch).update(
+            created=Case(*[
+                When(pk=pk, then=Value(values[pk][0])) for pk in batch
+            ], output_field=DateTimeField()),
+            modified=Case(*[
+                When(pk=pk, then=Value(values[pk][1])) for pk in batch
+            ], output_field=DateTimeField()),
+        )
+
+
+class SpaceImport(object):
+    """
+        Imports an archive into a space, below the wiki root. See
+        import_space().
+    """
+
+    def __init__(self, space, filename, batch_size=500):
+        self.space = space
+        self.filename = filename
+        self.batch_size = batch_size
+        self.wiki, _ = SpacesWiki.objects.get_or_create(space=space)
+        self.root = URLPath.objects.select_for_update().get(
+            pk=URLPath.root().pk)
+        # top level slugs are shared with all other spaces
+        self.taken = set(
+            slug.lower() for slug in URLPath.objects.filter(
+                parent=self.root
+            ).values_list('slug', flat=True)
+        )
+        self.urlpath_type = ContentType.objects.get_for_model(URLPath)
+        self.users = {}
+        self.urlpaths = {}
+        self.paths = {}
+
+    def scan(self):
+        """
+            First pass over the archive: validates the tree structure and
+            computes parents and nested set values of all articles.
+        """
+        lines = read_lines(self.filename)
+        header = next(lines, None)
+        if header is None or header.get('version') != FORMAT_VERSION:
+            raise ValueError('Unsupported archive format.')
+        self.parents = []
+        self.lft = []
+        self.rght = []
+        # new articles are appended as last children of the root
+        counter = self.root.rght
+        stack = []
+        for i, data in enumerate(lines):
+            level = data['level']
+            if not 1 <= level <= len(stack) + 1:
+                raise ValueError('Invalid level of article %d.' % (i + 1))
+            while len(stack) >= level:
+                self.rght[stack.pop()] = counter
+                counter += 1
+            self.parents.append(stack[-1] if stack else None)
+            self.lft.append(counter)
+            self.rght.append(None)
+            counter += 1
+            stack.append(i)
+        while stack:
+            self.rght[stack.pop()] = counter
+            counter += 1
+        return len(self.lft)
+
+    def get_user_ids(self, usernames):
+        missing = set(usernames) - set(self.users) - {None}
+        if missing:
+            User = get_user_model()
+            self.users.update(User.objects.filter(**{
+                '%s__in' % User.USERNAME_FIELD: missing
+            }).values_list(User.USERNAME_FIELD, 'pk'))
+            # unknown users become anonymous
+            self.users.update((username, None) for username in missing
+                              if username not in self.users)
+        return self.users
+
+    def import_batch(self, batch):
+        """
+            Creates the articles of a list of (index, data) tuples with a
+            constant number of queries per batch and tree level.
+        """
+        users = self.get_user_ids(
+            [data['owner'] for i, data in batch] +
+            [revision['user'] for i, data in batch
+             for revision in data['revisions']])
+
+        articles = [
+            Article(
+                owner_id=users.get(data['owner']),
+                **{field: data[field] for field in ARTICLE_FIELDS}
+            ) for i, data in batch
+        ]
+        bulk_create(Article, articles)
+
+        # revisions are created in rounds, so every revision can refer to
+        # its previous one
+        revisions = [[] for article in articles]
+        rounds = max(len(data['revisions']) for i, data in batch)
+        for n in range(rounds):
+            created = []
+            for article, (i, data), article_revisions in zip(articles, batch, revisions):
+                if n >= len(data['revisions']):
+                    continue
+                revision_data = data['revisions'][n]
+                revision = ArticleRevision(
+                    article=article,
+                    user_id=users.get(revision_data['user']),
+                    previous_revision=article_revisions[-1] if article_revisions else None,
+                    **{field: revision_data[field] for field in REVISION_FIELDS}
+                )
+                article_revisions.append(revision)
+                created.append(revision)
+            bulk_create(ArticleRevision, created)
+
+        dates = {}
+        current = {}
+        for article, (i, data), article_revisions in zip(articles, batch, revisions):
+            for revision, revision_data in zip(article_revisions, data['revisions']):
+                dates[revision.pk] = (
+                    parse_datetime(revision_data['created']),
+                    parse_datetime(revision_data['modified']),
+                )
+                if revision.revision_number == data['current']:
+                    article.current_revision = revision
+            if article.current_revision is None:
+                article.current_revision = article_revisions[-1]
+            current[article.pk] = article.current_revision.pk
+        update_dates(ArticleRevision, dates)
+        update_dates(Article, {
+            article.pk: (parse_datetime(data['created']), parse_datetime(data['modified']))
+            for article, (i, data) in zip(articles, batch)
+        })
+        Article.objects.filter(pk__in=list(current)).update(
+            current_revision=Case(*[
+                When(pk=pk, then=Value(revision_id))
+                for pk, revision_id in current.items()
+            ], output_field=IntegerField())
+        )
+
+        # parents are created before their children, level by level
+        levels = {}
+        for article, (i, data) in zip(articles, batch):
+            levels.setdefault(data['level'], []).append((i, data, article))
+        for level in sorted(levels):
+            urlpaths = []
+            for i, data, article in levels[level]:
+                parent = self.parents[i]
+                if parent is None:
+                    slug = free_slug(data['slug'], self.taken)
+                    self.taken.add(slug.lower())
+                    self.paths[i] = slug + '/'
+                else:
+                    slug = data['slug']
+                    self.paths[i] = '%s%s/' % (self.paths[parent], slug)
+                urlpaths.append(URLPath(
+                    site_id=self.root.site_id,
+                    parent_id=self.urlpaths[parent] if parent is not None else self.root.pk,
+                    slug=slug,
+                    article=article,
+                    tree_id=self.root.tree_id,
+                    level=level,
+                    lft=self.lft[i],
+                    rght=self.rght[i],
+                ))
+            URLPath.objects.bulk_create(urlpaths)
+            # nested set values are unique within the tree
+            pks = dict(URLPath.objects.filter(
+                tree_id=self.root.tree_id,
+                lft__in=[urlpath.lft for urlpath in urlpaths]
+            ).values_list('lft', 'pk'))
+            for (i, data, article), urlpath in zip(levels[level], urlpaths):
+                urlpath.pk = self.urlpaths[i] = pks[urlpath.lft]
+
+        ArticleForObject.objects.bulk_create([
+            ArticleForObject(
+                article=article,
+                content_type=self.urlpath_type,
+                object_id=self.urlpaths[i],
+                is_mptt=True
+            ) for article, (i, data) in zip(articles, batch)
+        ])
+        WikiArticle.objects.bulk_create([
+            WikiArticle(
+                article=article,
+                wiki=self.wiki,
+                space=self.space,
+                title=article.current_revision.title,
+                path=ArticlePath.normalize(self.paths[i]),
+                deleted=article.current_revision.deleted,
+                modified=parse_datetime(data['modified']),
+                owner_id=article.owner_id
+            ) for article, (i, data) in zip(articles, batch)
+        ])
+        ArticlePath.objects.bulk_create([
+            ArticlePath(
+                space=self.space,
+                path=ArticlePath.normalize(self.paths[i]),
+                urlpath_id=self.urlpaths[i],
+                article=article
+            ) for article, (i, data) in zip(articles, batch)
+        ])
+        postings = []
+        for article in articles:
+            postings.extend(get_postings(article, self.space.pk))
+        SearchTerm.objects.bulk_create(postings, batch_size=1000)
+
+    def run(self):
+        count = self.scan()
+        lines = read_lines(self.filename)
+        next(lines)
+        batch = []
+        for i, data in enumerate(lines):
+            batch.append((i, data))
+            if len(batch) == self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        URLPath.objects.filter(pk=self.root.pk).update(
+            rght=F('rght') + 2 * count)
+        space_id = self.space.pk
+
+        def invalidate():
+            bump_tree_version(space_id)
+            clear_recent_changes(space_id)
+        # again after commit, for readers caching the old state meanwhile
+        invalidate()
+        transaction.on_commit(invalidate)
+        return count
+
+@transaction.atomic
+def import_space(space, filename, batch_size=500):
+    """
+        Imports the archive filename into space, adding its top level
+        articles below the wiki root. Top level slugs already used by
+        another article get a number appended.
+        The wiki root is locked for the duration of the import, so the
+        article tree can't be changed concurrently.
+        Returns the number of articles imported.
+    """
+    return SpaceImport(space, filename, batch_size).run()
@@ -0,0 +1,207 @@
+"""
+    The trash of a space: its soft-deleted articles.
+
+    Deleted articles are listed with keyset pagination on WikiArticle's
+    (space, deleted, modified) index, newest deletion first. Restoring and
+    purging work in batches, each in a transaction of its own, so no
+    single transaction holds locks on the shared wiki tree for long.
+    Purges requested in the trash view, and the articles of deleted wikis,
+    are queued as PendingPurge rows and carried out by the
+    process_wiki_events worker (see purge_pending).
+"""
+import datetime
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import ugettext as _
+from wiki.models import Article, ArticleRevision, URLPath
+
+from .models import PendingPurge, WikiArticle
+from .permissions import get_space_permissions
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor(wikiarticle):
+    """
+        Returns the position of wikiarticle in the trash as a string.
+    """
+    delta = wikiarticle.modified - EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+    return '%d-%d' % (microseconds, wikiarticle.pk)
+
+def decode_cursor(cursor):
+    """
+        Returns the (modified, pk) tuple encoded by encode_cursor, or None.
+    """
+    try:
+        microseconds, pk = [int(part) for part in cursor.split('-')]
+    except (AttributeError, ValueError):
+        return None
+    return EPOCH + datetime.timedelta(microseconds=microseconds), pk
+
+def get_trash(space, before=None, limit=25):
+    """
+        Returns up to limit deleted articles of space (as WikiArticles)
+        deleted before the position given by the cursor before, newest
+        first, and the cursor of the next page or None.
+    """
+    wikiarticles = WikiArticle.objects.filter(
+        space=space,
+        deleted=True
+    ).select_related('owner').order_by('-modified', '-pk')
+    position = decode_cursor(before) if before else None
+    if position is not None:
+        modified, pk = position
+        wikiarticles = wikiarticles.filter(
+            Q(modified__lt=modified) | Q(modified=modified, pk__lt=pk))
+    wikiarticles = list(wikiarticles[:limit + 1])
+    if len(wikiarticles) > limit:
+        return wikiarticles[:limit], encode_cursor(wikiarticles[limit - 1])
+    return wikiarticles, None
+
+def trashed_articles(space, article_ids):
+    """
+        Returns the deleted articles of space among article_ids.
+    """
+    return Article.objects.filter(
+        pk__in=article_ids,
+        wikiarticle__space=space,
+        wikiarticle__deleted=True
+    ).select_related('current_revision').defer('current_revision__content')
+
+def can_restore(request, article):
+    """
+        wiki's rule for restoring an article, restricted to its owner and
+        space administrators like the SpaceDeleted view.
+    """
+    user = request.user
+    if not get_space_permissions(user, request.SPACE).is_owner_or_admin(
+            user, article.owner_id):
+        return False
+    return (not article.current_revision.locked and article.can_delete(user)) \
+        or article.can_moderate(user)
+
+def restore_articles(request, article_ids, batch_size=100):
+    """
+        Restores the given deleted articles of the current space the user
+        may restore, batch_size articles per transaction.
+        Returns the number of restored articles.
+    """
+    article_ids = list(article_ids)
+    restored = 0
+    for start in range(0, len(article_ids), batch_size):
+        with transaction.atomic():
+            for article in trashed_articles(
+                    request.SPACE, article_ids[start:start + batch_size]):
+                if not can_restore(request, article):
+                    continue
+                revision = ArticleRevision()
+                revision.inherit_predecessor(article)
+                revision.set_from_request(request)
+                revision.deleted = False
+                revision.automatic_log = _('Restoring article')
+                article.add_revision(revision)
+                restored += 1
+    return restored
+
+def purge_article(article, batch_size=100):
+    """
+        Removes article and everything below it for good, deepest articles
+        first, batch_size articles per transaction. Revisions, plugins
+        (e.g. attachments) and index entries go with their articles.
+        Like django-wiki's own purge, this leaves gaps in the nested set
+        instead of renumbering the shared tree.
+    """
+    urlpath = URLPath.objects.filter(article=article).order_by('pk').first()
+    if urlpath is not None:
+        descendants = list(urlpath.get_descendants().order_by(
+            '-level', '-lft'
+        ).values_list('article_id', flat=True))
+        for start in range(0, len(descendants), batch_size):
+            with transaction.atomic():
+                delete_articles(descendants[start:start + batch_size])
+    with transaction.atomic():
+        delete_articles([article.pk])
+
+def delete_articles(article_ids):
+    for article in Article.objects.filter(pk__in=article_ids):
+        article.delete()
+
+def purge_trash(space, article_ids=None, deleted_before=None, batch_size=100):
+    """
+        Purges the deleted articles of space, optionally only those among
+        article_ids or deleted before the given time, oldest first.
+        Articles with articles of other spaces below them are left in the
+        trash (see can_purge).
+        Returns the number of purged articles and the ids of the skipped
+        ones.
+    """
+    wikiarticles = WikiArticle.objects.filter(space=space, deleted=True)
+    if article_ids is not None:
+        wikiarticles = wikiarticles.filter(article__in=list(article_ids))
+    if deleted_before is not None:
+        wikiarticles = wikiarticles.filter(modified__lt=deleted_before)
+    purged, skipped = 0, []
+    for article_id in list(wikiarticles.order_by(
+            'modified', 'pk').values_list('article_id', flat=True)):
+        # may be gone with an ancestor already
+        article = Article.objects.filter(pk=article_id).first()
+        if article is None:
+            continue
+        if not can_purge(article.pk):
+            skipped.append(article.pk)
+            continue
+        purge_article(article, batch_size)
+        purged += 1
+    return purged, skipped
+
+def schedule_purge(space, article_ids):
+    """
+        Queues the deleted articles of space among article_ids for
+        purge_pending. Returns the number of queued articles.
+    """
+    article_ids = set(trashed_articles(space, article_ids).values_list(
+        'pk', flat=True))
+    queued = set(PendingPurge.objects.filter(
+        article_id__in=article_ids
+    ).values_list('article_id', flat=True))
+    PendingPurge.objects.bulk_create([
+        PendingPurge(article_id=article_id)
+        for article_id in sorted(article_ids - queued)
+    ])
+    return len(article_ids)
+
+def can_purge(article_id):
+    """
+        May the queued article be purged? Not if it was restored in the
+        meantime, or if anything below it belongs to another space (to
+        any space, for the articles of a deleted wiki).
+    """
+    wikiarticle = WikiArticle.objects.filter(
+        article_id=article_id
+    ).values('space_id', 'deleted').first()
+    if wikiarticle is not None and not wikiarticle['deleted']:
+        return False
+    urlpath = URLPath.objects.filter(article_id=article_id).order_by('pk').first()
+    if urlpath is None:
+        return True
+    others = urlpath.get_descendants().filter(article__wikiarticle__isnull=False)
+    if wikiarticle is not None:
+        others = others.exclude(article__wikiarticle__space_id=wikiarticle['space_id'])
+    return not others.exists()
+
+def purge_pending(limit=100, batch_size=100):
+    """
+        Purges up to limit queued articles, oldest first, unless can_purge
+        forbids it. Returns the number of purged articles.
+    """
+    purged = 0
+    for pending in list(PendingPurge.objects.order_by('pk')[:limit]):
+        # may be gone with an ancestor already
+        article = Article.objects.filter(pk=pending.article_id).first()
+        if article is not None and can_purge(article.pk):
+            purge_article(article, batch_size)
+            purged += 1
+        pending.delete()
+    return purged
@@ -27,7 +27,11 @@ class SpaceWikiURLPatterns(WikiURLPatterns):
     article_source_view_class = views.SpaceSource
     article_plugin_view_class = views.SpacePlugin
     revision_change_view_class = views.SpaceChangeRevisionView
+    revision_merge_view = staticmethod(views.merge)
     root_view_class = views.SpaceIndex
+    search_view_class = views.SpaceSearchView
+    recent_view_class = views.SpaceRecentChanges
+    trash_view_class = views.SpaceTrash
 
     def get_root_urls(self):
         urlpatterns = [
@@ -36,12 +40,17 @@ class SpaceWikiURLPatterns(WikiURLPatterns):
                 self.root_view_class.as_view(),
                 name='root',
                 kwargs={'path': ''}),
-# Disabled for now
-#            url('^_search/$',
-#                import_class(self.search_view_class).as_view(),
-#                name='search'),
+            re_path('^_search/$',
+                self.search_view_class.as_view(),
+                name='search'),
+            re_path('^_recent/$',
+                self.recent_view_class.as_view(),
+                name='recent'),
+            re_path('^_trash/$',
+                self.trash_view_class.as_view(),
+                name='trash'),
             re_path('^_revision/diff/(?P<revision_id>[0-9]+)/$',
-                self.article_diff_view,
+                self.article_diff_view.as_view(),
                 name='diff'),
         ]
         return urlpatterns
@@ -1,36 +1,79 @@
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponseRedirect, Http404
-from django.shortcuts import render, redirect
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Length
+from django.http import HttpResponseRedirect, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, render, redirect
 from django.urls import reverse
 from django.utils.decorators import method_decorator
-from django.utils.translation import ugettext as _
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import get_language, ugettext as _, ungettext
+from django.views.generic import TemplateView
 
-from actstream.signals import action as actstream_action
 from guardian.mixins import PermissionRequiredMixin
 from wiki.conf import settings
+from wiki.core.diff import simple_merge
 from wiki.decorators import get_article
 from wiki.forms import EditForm, DeleteForm
-from wiki.models import URLPath
+from wiki.models import Article, ArticleRevision, URLPath
 import wiki.views.article as wiki_article
 
-from collab.decorators import permission_required_or_403, space_admin_required
 from spaces.models import SpacePluginRegistry
 from spaces_notifications.mixins import NotificationMixin
-from .forms import SpaceCreateForm, SpaceDeleteForm
-from .models import SpacesWiki, WikiArticle, WikiPlugin
+from .cache import get_toc, get_tree_version
+from .conditional import article_condition
+from .decorators import space_access_required, space_admin_required
+from .deltas import DELTA_REVISIONS, expand_revision, load_content, store_delta
+from .diffs import get_revision_diff
+from .forms import SpaceCreateForm, SpaceDeleteForm, unique_slug
+from .instrumentation import instrumented, phase, timed
+from .models import ArticlePath, SpacesWiki, WikiArticle, WikiEvent, WikiPlugin
+from .outbox import record_event
+from .permissions import get_space_permissions
 from .mixins import SpaceArticleMixin, ArticlePermissionMixin, ArticleRestorePermissionMixin
+from .queries import space_directory
+from .recent import RECENT_SIZE, get_recent_changes
+from .resolver import get_user_role, resolve_article
+from .rendering import render_article
+from .revisions import COALESCE_WINDOW, coalesce_revision
+from .search import search
+from .trash import get_trash, restore_articles, schedule_purge
+
+# attempts at creating an article before giving up on slug conflicts
+SLUG_ATTEMPTS = 5
 
 class WikiContextMixin(object):
     """
         Adds 
-        * a complete list of articles to the context. Useful for
+        * a complete, cached tree of articles to the context. Useful for
           displaying a table of contents for the wiki.
+        * versions, the user's role and write access for keying cached
+          fragments
     """
     def get_context_data(self, **kwargs):
         context = super(WikiContextMixin, self).get_context_data(**kwargs)
-        context["full_tree"] = URLPath.objects.filter(
-            article__wikiarticle__wiki__space=self.request.SPACE
-        )
+        request = self.request
+        space_id = request.SPACE.pk
+
+        def toc():
+            with phase(request, 'toc'):
+                return get_toc(space_id)
+        # lazy, so views not rendering the toc don't even hit the cache
+        context["toc"] = SimpleLazyObject(toc)
+        # keys of cached template fragments, see includes/toc.html etc.
+        language = get_language()
+        context['wiki_fragment_version'] = SimpleLazyObject(
+            lambda: '%s-%s-%s' % (space_id, get_tree_version(space_id), language))
+        context['wiki_cache_timeout'] = settings.CACHE_TIMEOUT
+        article = getattr(self, 'article', None)
+        if article is not None:
+            context['wiki_user_role'] = SimpleLazyObject(
+                lambda: get_user_role(request, article))
+            # per-article ACLs decide about editing, not only the role
+            context['wiki_can_edit'] = SimpleLazyObject(
+                lambda: article.can_write(request.user) and
+                not article.current_revision.locked)
         context['plugin_selected'] = WikiPlugin.name
         return context
 
@@ -38,8 +81,10 @@ class WikiContextMixin(object):
 class SpaceArticleView(WikiContextMixin, wiki_article.ArticleView, SpaceArticleMixin):
     template_name = 'spaces_wiki/view.html'
 
-    @method_decorator(get_article(can_read=True))
-    @method_decorator(permission_required_or_403('access_space'))
+    @method_decorator(instrumented('article'))
+    @method_decorator(timed('condition', article_condition))
+    @method_decorator(timed('get_article', get_article(can_read=True)))
+    @method_decorator(timed('permission', space_access_required))
     def dispatch(self, request, article, *args, **kwargs):
         # hackish: method decorator pops 'article_id' and 'path', so we 
         # add them back to make muliple decorator calls possible
@@ -63,8 +108,10 @@ class SpaceArticleView(WikiContextMixin, wiki_article.ArticleView, SpaceArticleM
 
 class SpaceDir(WikiContextMixin, wiki_article.Dir, SpaceArticleMixin):
 
-    @method_decorator(get_article(can_read=True))
-    @method_decorator(permission_required_or_403('access_space'))
+    @method_decorator(instrumented('dir'))
+    @method_decorator(timed('condition', article_condition))
+    @method_decorator(timed('get_article', get_article(can_read=True)))
+    @method_decorator(timed('permission', space_access_required))
     def dispatch(self, request, article, *args, **kwargs):
         # hackish, see SpaceArticleView.dispatch    
         kwargs['article_id'] = article.id
@@ -77,13 +124,61 @@ class SpaceDir(WikiContextMixin, wiki_article.Dir, SpaceArticleMixin):
         )
 
     def get_queryset(self):
-        children = super(SpaceDir, self).get_queryset()
-        children = children.filter(article__wikiarticle__wiki__space=self.request.SPACE)
-        return children
+        return space_directory(
+            self.urlpath,
+            self.request.SPACE,
+            user=self.request.user,
+            query=self.query
+        )
+
 
+class SpaceDiffView(WikiContextMixin, wiki_article.DiffView):
+    """
+        Returns the diff of a revision to its predecessor as JSON hunks
+        (see spaces_wiki.diffs), hunks_per_page at a time starting at the
+        hunk given by the GET parameter 'offset'. get_object checks the
+        space and read permission of the revision's article.
+    """
+    hunks_per_page = 20
 
-class SpaceDiffView(WikiContextMixin, wiki_article.DiffView, SpaceArticleMixin):
-    pass
+    @method_decorator(space_access_required)
+    def dispatch(self, request, *args, **kwargs):
+        return super(SpaceDiffView, self).dispatch(request, *args, **kwargs)
+
+    def get_queryset(self):
+        # contents are only needed if the diff isn't cached yet
+        return ArticleRevision.objects.select_related(
+            'article',
+            'previous_revision'
+        ).defer('content', 'previous_revision__content')
+
+    def get_object(self, queryset=None):
+        revision = super(SpaceDiffView, self).get_object(queryset)
+        resolved = resolve_article(self.request, revision.article)
+        if not resolved.is_root and resolved.space_id != self.request.SPACE.pk:
+            raise Http404(_('Article does not exist'))
+        if not revision.article.can_read(self.request.user):
+            raise PermissionDenied
+        return revision
+
+    def render_to_response(self, context, **response_kwargs):
+        revision = self.object
+        hunks = get_revision_diff(revision)
+        try:
+            offset = max(int(self.request.GET.get('offset', 0)), 0)
+        except ValueError:
+            offset = 0
+        end = offset + self.hunks_per_page
+        other_changes = []
+        previous = revision.previous_revision
+        if offset == 0 and (previous is None or previous.title != revision.title):
+            other_changes.append((_('New title'), revision.title))
+        return JsonResponse({
+            'hunks': hunks[offset:end],
+            'count': len(hunks),
+            'next': end if end < len(hunks) else None,
+            'other_changes': other_changes,
+        })
 
 class SpaceIndex(SpaceDir):
     template_name="spaces_wiki/index.html"
@@ -94,8 +189,9 @@ class SpaceCreate(NotificationMixin, WikiContextMixin, wiki_article.Create, Spac
     notification_label = 'spaces_wiki_create'
     notification_send_manually = True
 
-    @method_decorator(get_article(can_write=True, can_create=True))
-    @method_decorator(permission_required_or_403('access_space'))
+    @method_decorator(instrumented('create'))
+    @method_decorator(timed('get_article', get_article(can_write=True, can_create=True)))
+    @method_decorator(timed('permission', space_access_required))
     def dispatch(self, request, article, *args, **kwargs):
         # hackish, see SpaceArticleView.dispatch    
         kwargs['article_id'] = article.id
@@ -112,32 +208,56 @@ class SpaceCreate(NotificationMixin, WikiContextMixin, wiki_article.Create, Spac
         context['create_form'] = self.get_form(SpaceCreateForm)
         return context
 
+    @transaction.atomic
     def form_valid(self, form):
-        ret = super(SpaceCreate, self).form_valid(form)
-        root_redirect = redirect('wiki:get','')
-        if isinstance(ret, HttpResponseRedirect) and root_redirect.url != ret.url:
-            # super().form_valid successfully created a new article,
-            # now get the new article and create our own WikiArticle instance
-            # for proper integration.
-            new_article = self.newpath.article
-            wiki = SpacesWiki.objects.get(space=self.request.SPACE)
-            wiki_article = WikiArticle.objects.create(
-                article = new_article,
-                wiki = wiki
-            )
-            # create dashboard notification
-            actstream_action.send(
-                sender=self.request.user,
-                verb=_("was created"),
-                target=self.request.SPACE,
-                action_object=wiki_article
+        """
+            Creates the article like wiki's Create.form_valid, but picks
+            another free slug if a concurrent request took the cleaned one
+            in the meantime. The unique constraint on parent and slug
+            detects the conflict, each attempt runs in a savepoint.
+        """
+        slug = form.cleaned_data['slug']
+        for attempt in range(SLUG_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    self.newpath = URLPath._create_urlpath_from_request(
+                        self.request,
+                        self.article,
+                        self.urlpath,
+                        slug,
+                        form.cleaned_data['title'],
+                        form.cleaned_data['content'],
+                        form.cleaned_data['summary']
+                    )
+                break
+            except IntegrityError:
+                slug = unique_slug(self.urlpath, form.requested_slug)
+        else:
+            messages.error(
+                self.request,
+                _("There was an error creating this article.")
             )
-            # set title and link for notification mail
-            self.notification_object_title = new_article
-            self.notification_object_link = new_article.get_absolute_url()
-            self.send_notification()
-            
-        return ret
+            return redirect('wiki:get', '')
+        messages.success(
+            self.request,
+            _("New article '%s' created.") %
+            self.newpath.article.current_revision.title
+        )
+        # now get the new article and create our own WikiArticle instance
+        # for proper integration.
+        new_article = self.newpath.article
+        wiki = SpacesWiki.objects.get(space=self.request.SPACE)
+        wiki_article = WikiArticle.objects.create(
+            article = new_article,
+            wiki = wiki
+        )
+        # dashboard notification and mails are sent by the outbox
+        # worker, see spaces_wiki.outbox
+        record_event(WikiEvent.CREATED, wiki_article, self.request.user)
+        # warm the render cache, the author is about to view the article
+        space_id = self.request.SPACE.pk
+        transaction.on_commit(lambda: render_article(new_article, space_id))
+        return self.get_success_url()
 
 class SpaceSettings(wiki_article.Settings):
 
@@ -148,9 +268,12 @@ class SpaceSettings(wiki_article.Settings):
     
 class SpaceHistory(WikiContextMixin, wiki_article.History, SpaceArticleMixin):
     template_name = "spaces_wiki/history.html"
+    paginate_by = None
+    revisions_per_page = 10
 
-    @method_decorator(get_article(can_read=True, deleted_contents=True))
-    @method_decorator(permission_required_or_403('access_space'))
+    @method_decorator(instrumented('history'))
+    @method_decorator(timed('get_article', get_article(can_read=True, deleted_contents=True)))
+    @method_decorator(timed('permission', space_access_required))
     def dispatch(self, request, article, *args, **kwargs):
         # hackish, see SpaceArticleView.dispatch    
         kwargs['article_id'] = article.id
@@ -162,10 +285,69 @@ class SpaceHistory(WikiContextMixin, wiki_article.History, SpaceArticleMixin):
             **kwargs
         )
 
+    def get_revision_number(self, name):
+        try:
+            return int(self.request.GET[name])
+        except (KeyError, ValueError):
+            return None
+
+    def get_queryset(self):
+        """
+            Keyset pagination: returns the revisions_per_page revisions
+            older than the revision number given by the GET parameter
+            'before', or newer than the one given by 'after', with a single
+            query on the (article, revision_number) index. Only metadata is
+            loaded, content is fetched on demand by preview and diff views.
+        """
+        revisions = ArticleRevision.objects.filter(
+            article=self.article
+        ).select_related('user').defer('content').annotate(
+            previous_number=F('previous_revision__revision_number'),
+            # unknown for delta-encoded revisions
+            size=Case(
+                When(delta__isnull=True, then=Length('content')),
+                default=Value(None),
+                output_field=IntegerField()
+            )
+        )
+        before = self.get_revision_number('before')
+        after = self.get_revision_number('after')
+        limit = self.revisions_per_page
+        self.history_newer = self.history_older = None
+        if after is not None:
+            revisions = list(revisions.filter(
+                revision_number__gt=after
+            ).order_by('revision_number')[:limit + 1])
+            more = len(revisions) > limit
+            revisions = revisions[:limit][::-1]
+            if revisions:
+                if more:
+                    self.history_newer = revisions[0].revision_number
+                self.history_older = revisions[-1].revision_number
+        else:
+            if before is not None:
+                revisions = revisions.filter(revision_number__lt=before)
+            revisions = list(revisions.order_by('-revision_number')[:limit + 1])
+            more = len(revisions) > limit
+            revisions = revisions[:limit]
+            if revisions:
+                if before is not None:
+                    self.history_newer = revisions[0].revision_number
+                if more:
+                    self.history_older = revisions[-1].revision_number
+        return revisions
+
+    def get_context_data(self, **kwargs):
+        context = super(SpaceHistory, self).get_context_data(**kwargs)
+        context['history_newer'] = self.history_newer
+        context['history_older'] = self.history_older
+        context['article_can_write'] = self.article.can_write(self.request.user)
+        return context
+
 # Note: untested!
 class SpacePlugin(wiki_article.Plugin):
 
-    @method_decorator(permission_required_or_403('access_space'))
+    @method_decorator(space_access_required)
     def dispatch(self, request, path=None, slug=None, **kwargs):
         return super(SpacePlugin,self).dispatch(
             request,
@@ -177,9 +359,11 @@ class SpacePlugin(wiki_article.Plugin):
 class SpaceEdit(NotificationMixin, WikiContextMixin, wiki_article.Edit, SpaceArticleMixin):
     template_name="spaces_wiki/edit.html"
     notification_label = 'spaces_wiki_modify'
+    notification_send_manually = True
 
-    @method_decorator(get_article(can_write=True, not_locked=True))
-    @method_decorator(permission_required_or_403('access_space'))
+    @method_decorator(instrumented('edit'))
+    @method_decorator(timed('get_article', get_article(can_write=True, not_locked=True)))
+    @method_decorator(timed('permission', space_access_required))
     def dispatch(self, request, article, *args, **kwargs):
         # hackish, see SpaceArticleView.dispatch    
         kwargs['article_id'] = article.id
@@ -190,20 +374,26 @@ class SpaceEdit(NotificationMixin, WikiContextMixin, wiki_article.Edit, SpaceArt
             *args, 
             **kwargs)
 
+    @transaction.atomic
     def form_valid(self, form):
-        # set title and link for notification mail
-        self.notification_object_title = self.article
-        self.notification_object_link  = self.article.get_absolute_url()
         ret = super(SpaceEdit, self).form_valid(form)
         if isinstance(ret, HttpResponseRedirect):
             # super().form_valid successfully saved the article
-            # create dashboard notification
-            actstream_action.send(
-                sender=self.request.user,
-                verb=_("was modified"),
-                target=self.request.SPACE,
-                action_object=self.article.wikiarticle
+            revision = self.article.current_revision
+            if COALESCE_WINDOW:
+                coalesce_revision(revision)
+            if DELTA_REVISIONS and revision.previous_revision is not None:
+                store_delta(revision.previous_revision)
+            # dashboard notification and mails are sent by the outbox
+            # worker, see spaces_wiki.outbox
+            record_event(
+                WikiEvent.MODIFIED,
+                self.article.wikiarticle,
+                self.request.user
             )
+            # warm the render cache, the author is about to view the article
+            article, space_id = self.article, self.request.SPACE.pk
+            transaction.on_commit(lambda: render_article(article, space_id))
 
         return ret
 
@@ -224,9 +414,9 @@ class SpaceDelete(WikiContextMixin, wiki_article.Delete, SpaceArticleMixin):
     form_class = SpaceDeleteForm
     template_name = "spaces_wiki/delete.html"
 
-    @method_decorator(get_article(can_write=True, not_locked=True, can_delete=True))
-    #@method_decorator(permission_required_or_403('access_space'))
-    @method_decorator(space_admin_required)
+    @method_decorator(instrumented('delete'))
+    @method_decorator(timed('get_article', get_article(can_write=True, not_locked=True, can_delete=True)))
+    @method_decorator(timed('permission', space_admin_required))
     def dispatch(self, request, article, *args, **kwargs):
         # hackish, see SpaceArticleView.dispatch    
         kwargs['article_id'] = article.id
@@ -259,11 +449,12 @@ class SpaceDelete(WikiContextMixin, wiki_article.Delete, SpaceArticleMixin):
 
 
 
-class SpaceDeleted (WikiContextMixin, ArticleRestorePermissionMixin, wiki_article.Deleted):
+class SpaceDeleted (WikiContextMixin, ArticleRestorePermissionMixin, wiki_article.Deleted, SpaceArticleMixin):
     template_name = "spaces_wiki/deleted.html"
     
-    @method_decorator(get_article(can_read=True, deleted_contents=True))
-    @method_decorator(permission_required_or_403('access_space'))
+    @method_decorator(instrumented('deleted'))
+    @method_decorator(timed('get_article', get_article(can_read=True, deleted_contents=True)))
+    @method_decorator(timed('permission', space_access_required))
     def dispatch(self, request, article, *args, **kwargs):
         # hackish, see SpaceArticleView.dispatch    
         kwargs['article_id'] = article.id
@@ -277,8 +468,10 @@ class SpaceDeleted (WikiContextMixin, ArticleRestorePermissionMixin, wiki_articl
 
 class SpaceSource(WikiContextMixin, wiki_article.Source, SpaceArticleMixin):
     
-    @method_decorator(get_article(can_read=True, deleted_contents=True))
-    @method_decorator(permission_required_or_403('access_space'))
+    @method_decorator(instrumented('source'))
+    @method_decorator(timed('condition', article_condition))
+    @method_decorator(timed('get_article', get_article(can_read=True, deleted_contents=True)))
+    @method_decorator(timed('permission', space_access_required))
     def dispatch(self, request, article, *args, **kwargs):
         # hackish, see SpaceArticleView.dispatch    
         kwargs['article_id'] = article.id
@@ -293,8 +486,9 @@ class SpaceSource(WikiContextMixin, wiki_article.Source, SpaceArticleMixin):
 class SpacePreview(WikiContextMixin, wiki_article.Preview, SpaceArticleMixin):
     template_name = "spaces_wiki/preview_inline.html"
     
-    @method_decorator(get_article(can_read=True, deleted_contents=True))
-    @method_decorator(permission_required_or_403('access_space'))
+    @method_decorator(instrumented('preview'))
+    @method_decorator(timed('get_article', get_article(can_read=True, deleted_contents=True)))
+    @method_decorator(timed('permission', space_access_required))
     def dispatch(self, request, article, *args, **kwargs):
         # hackish, see SpaceArticleView.dispatch
         kwargs['article_id'] = article.id
@@ -306,11 +500,17 @@ class SpacePreview(WikiContextMixin, wiki_article.Preview, SpaceArticleMixin):
             **kwargs
         )
 
+    def get(self, request, *args, **kwargs):
+        # previewing an old revision from the history
+        if self.revision:
+            load_content([self.revision])
+        return super(SpacePreview, self).get(request, *args, **kwargs)
+
 # Note: untested
 class SpaceChangeRevisionView(WikiContextMixin, wiki_article.ChangeRevisionView, SpaceArticleMixin):
 
     @method_decorator(get_article(can_write=True, not_locked=True))
-    @method_decorator(permission_required_or_403('access_space'))
+    @method_decorator(space_access_required)
     def dispatch(self, request, article, *args, **kwargs):
         # hackish, see SpaceArticleView.dispatch
         kwargs['article_id'] = article.id
@@ -321,6 +521,15 @@ class SpaceChangeRevisionView(WikiContextMixin, wiki_article.ChangeRevisionView,
             **kwargs
         )
 
+    def change_revision(self):
+        # the current revision has to hold its full content
+        expand_revision(get_object_or_404(
+            ArticleRevision,
+            article=self.article,
+            id=self.kwargs['revision_id']
+        ))
+        super(SpaceChangeRevisionView, self).change_revision()
+
     def get_redirect_url(self, **kwargs):
         if self.urlpath:
             return reverse("spaces_wiki:get", kwargs={'path': self.urlpath.path})
@@ -331,6 +540,167 @@ class SpaceChangeRevisionView(WikiContextMixin, wiki_article.ChangeRevisionView,
                     'article_id': self.article.id})
 
 
+@get_article(can_write=True)
+@space_access_required
+def merge(request, article, revision_id, urlpath=None, preview=False, **kwargs):
+    """
+        wiki's merge view, which reads the content of the merged revision,
+        so a delta-encoded revision is expanded first. Previews only load
+        its content, without storing it.
+    """
+    revision = get_object_or_404(
+        ArticleRevision,
+        id=revision_id,
+        article=article,
+        article__wikiarticle__space=request.SPACE
+    )
+    if preview:
+        load_content([revision])
+        return render(request, 'wiki/preview_inline.html', {
+            'article': article,
+            'title': article.current_revision.title,
+            'revision': None,
+            'merge1': revision,
+            'merge2': article.current_revision,
+            'merge': True,
+            'content': simple_merge(
+                article.current_revision.content,
+                revision.content
+            ),
+        })
+    expand_revision(revision)
+    # hackish, see SpaceArticleView.dispatch
+    kwargs['article_id'] = article.id
+    if urlpath is not None:
+        kwargs['path'] = urlpath.path
+    return wiki_article.merge(request, revision_id=revision_id, **kwargs)
+
+
+class SpaceSearchView(WikiContextMixin, wiki_article.SearchView):
+    """
+        Ranked full-text search over the articles of the current space,
+        backed by the space's search index (see spaces_wiki.search).
+    """
+    template_name = "spaces_wiki/search.html"
+
+    @method_decorator(space_access_required)
+    def dispatch(self, request, *args, **kwargs):
+        return super(SpaceSearchView, self).dispatch(request, *args, **kwargs)
+
+    def get_queryset(self):
+        # filtered before paginating, so pages and counts only include
+        # readable articles
+        return search(self.request.SPACE, self.query, self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super(SpaceSearchView, self).get_context_data(**kwargs)
+        # only load the articles of the current page
+        ids = [result['article'] for result in context['articles']]
+        articles = Article.objects.select_related('current_revision').in_bulk(ids)
+        paths = dict(ArticlePath.objects.filter(
+            article__in=ids
+        ).values_list('article_id', 'path'))
+        results = []
+        for pk in ids:
+            article = articles.get(pk)
+            # e.g. removed since the page was counted
+            if article is None or pk not in paths:
+                continue
+            article.path = paths[pk]
+            results.append(article)
+        context['articles'] = results
+        return context
+
+
+class SpaceRecentChanges(WikiContextMixin, TemplateView):
+    """
+        The most recently changed articles of the current space, served
+        from the space's cached list (see spaces_wiki.recent). The number
+        of articles is given by the GET parameter 'count'.
+    """
+    template_name = "spaces_wiki/recent.html"
+
+    @method_decorator(space_access_required)
+    def dispatch(self, request, *args, **kwargs):
+        return super(SpaceRecentChanges, self).dispatch(request, *args, **kwargs)
+
+    def get_count(self):
+        try:
+            count = int(self.request.GET.get('count', RECENT_SIZE))
+        except ValueError:
+            count = RECENT_SIZE
+        return min(max(count, 1), RECENT_SIZE)
+
+    def get_context_data(self, **kwargs):
+        context = super(SpaceRecentChanges, self).get_context_data(**kwargs)
+        context['changes'] = get_recent_changes(
+            self.request.SPACE.pk,
+            self.get_count(),
+            self.request.user
+        )
+        return context
+
+
+class SpaceTrash(WikiContextMixin, TemplateView):
+    """
+        The deleted articles of the current space, trash_per_page at a time
+        (see spaces_wiki.trash). Selected articles can be restored by their
+        owners and space administrators, and queued for purging by space
+        administrators; the process_wiki_events worker removes them.
+        Purging old articles in bulk is left to the purge_wiki_trash
+        management command.
+    """
+    template_name = "spaces_wiki/trash.html"
+    trash_per_page = 25
+
+    @method_decorator(space_access_required)
+    def dispatch(self, request, *args, **kwargs):
+        return super(SpaceTrash, self).dispatch(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super(SpaceTrash, self).get_context_data(**kwargs)
+        wikiarticles, next_page = get_trash(
+            self.request.SPACE,
+            before=self.request.GET.get('before'),
+            limit=self.trash_per_page
+        )
+        readable = set(Article.objects.filter(
+            pk__in=[wikiarticle.article_id for wikiarticle in wikiarticles]
+        ).can_read(self.request.user).values_list('pk', flat=True))
+        context['trash'] = [
+            wikiarticle for wikiarticle in wikiarticles
+            if wikiarticle.article_id in readable
+        ]
+        context['trash_next'] = next_page
+        context['trash_can_purge'] = get_space_permissions(
+            self.request.user, self.request.SPACE).admin
+        return context
+
+    def post(self, request, *args, **kwargs):
+        try:
+            article_ids = [int(pk) for pk in request.POST.getlist('article')]
+        except ValueError:
+            article_ids = []
+        action = request.POST.get('action')
+        if action == 'restore':
+            count = restore_articles(request, article_ids)
+            messages.success(request, ungettext(
+                '%d article restored.',
+                '%d articles restored.',
+                count
+            ) % count)
+        elif action == 'purge':
+            if not get_space_permissions(request.user, request.SPACE).admin:
+                raise PermissionDenied
+            count = schedule_purge(request.SPACE, article_ids)
+            messages.success(request, ungettext(
+                '%d article will be purged shortly.',
+                '%d articles will be purged shortly.',
+                count
+            ) % count)
+        return redirect('spaces_wiki:trash')
+
+
 # dummy dict for translation strings
 trans_strings = {
     1: _('A new revision of the article was successfully added.')